@@ -12,17 +12,39 @@ class Settings(BaseSettings):
     # Base64-encoded credentials JSON for cloud deployment
     google_credentials_base64: str = ""
 
+    # Logging: records are queued and written as JSON lines by a background
+    # thread; repeated warnings/errors pass `burst` times per window
+    log_level: str = "INFO"
+    log_json: bool = True
+    log_queue_size: int = 10000
+    log_sample_window_seconds: float = 60.0
+    log_sample_burst: int = 5
+
     # CORS
     cors_origins: list[str] = ["*"]
 
+    # Admin endpoints (profiling). Disabled when empty.
+    admin_token: str = ""
+    max_profile_seconds: int = 60
+
     # Gemini API (for furniture detection)
     gemini_api_key: str = ""
     gemini_model: str = "gemini-2.5-flash"
     gemini_pro_model: str = "gemini-2.5-pro"
     use_gemini_pro: bool = False
+    # Flash-first routing (ignored when use_gemini_pro is set): detect with
+    # gemini_model and refine only low-confidence or unidentified items on pro
+    gemini_routing: bool = True
+    gemini_escalation_confidence: float = 0.7
+    # Upload static prompt instructions as Gemini cached context (falls back to inline)
+    gemini_context_cache: bool = False
+    gemini_context_cache_ttl_seconds: int = 3600
 
     # Serper.dev API (for product matching - fallback)
     serper_api_key: str = ""
+    # Concurrent Serper queries within this window are sent as one batched request
+    serper_batch_window_ms: int = 5
+    serper_batch_max_queries: int = 10
 
     # Wayfair API (partner retailer)
     wayfair_api_key: str = ""
@@ -31,10 +53,144 @@ class Settings(BaseSettings):
     # Product search settings
     min_partner_results: int = 3  # Minimum results from partners before falling back to Google
     default_product_limit: int = 6  # Default number of products to return
+    # Fallback searches ask for extra results to cover the ones deduplication
+    # drops: shortfall / (1 - duplicate rate), the rate smoothed per category
+    fallback_duplicate_rate_prior: float = 0.2
+    fallback_duplicate_rate_alpha: float = 0.3
+    fallback_duplicate_rate_max_keys: int = 500
+    fallback_max_overfetch_factor: float = 3.0
+
+    # Local approximate-nearest-neighbour index over products returned by live
+    # similar searches: a similar query is answered from it when it holds
+    # `limit` close matches in the category, otherwise searched live (Serper).
+    # product_index_path: .npy file the vectors are memory-mapped from
+    # (empty keeps the index in memory only).
+    product_index_enabled: bool = True
+    product_index_path: str = ""
+    product_index_dim: int = 512
+    product_index_max_products: int = 50000
+    product_index_lists: int = 64
+    product_index_probes: int = 8
+    product_index_min_score: float = 0.5
+    product_index_ttl_seconds: int = 3 * 24 * 3600
+
+    # Long-TTL cache of exact brand/model search results. Popular queries are
+    # refreshed in the background before they expire; expired entries are
+    # kept a while longer to serve stale when needed.
+    exact_cache_enabled: bool = True
+    exact_cache_ttl_seconds: int = 24 * 3600
+    exact_cache_stale_seconds: int = 7 * 24 * 3600
+    exact_cache_max_entries: int = 5000
+    exact_cache_refresh_interval_seconds: int = 3600
+    exact_cache_refresh_top_n: int = 200
+    exact_cache_refresh_concurrency: int = 4
+    # Queries to warm at startup, plus a file the popularity ranking is saved to
+    exact_cache_warm_queries: list[str] = []
+    exact_cache_popularity_file: str = ""
+
+    # Speculative match searches started right after /api/detect, so the
+    # follow-up /api/products/match calls find their results ready
+    prefetch_matches: bool = True
+    prefetch_max_concurrency: int = 8
+    prefetch_max_pending: int = 256
+    # Longest a match request waits on a running prefetch (capped by its deadline)
+    prefetch_join_timeout_seconds: float = 10.0
+    prefetch_result_ttl_seconds: int = 300
+    prefetch_max_entries: int = 2000
+
+    # Uploaded image sessions. The original is dropped after
+    # image_original_ttl_seconds once every detection has a reference crop
+    image_session_ttl_seconds: int = 600
+    image_session_max_entries: int = 100
+    image_original_ttl_seconds: int = 120
+    reference_crop_max_size: int = 768
+
+    # Upload limits for /api/detect
+    max_upload_bytes: int = 10 * 1024 * 1024
+    max_image_pixels: int = 50_000_000
+    min_image_dimension: int = 32
+
+    # Product image downloads for visual scoring
+    max_product_image_bytes: int = 5 * 1024 * 1024
+
+    # Cache of refine-pass results, matched by perceptual hash of the crop
+    refine_cache_enabled: bool = True
+    # Near-exact only: similar-looking different products must not share a brand/model
+    refine_cache_max_distance: int = 2
+    # Crop width/height ratios may differ by at most this fraction for a hit
+    refine_cache_max_aspect_ratio_diff: float = 0.15
+    refine_cache_max_per_label: int = 256
+    refine_cache_max_labels: int = 256
+
+    # Visual scoring is split into chunks of products scored concurrently;
+    # chunks that miss their timeout are dropped and the rest still count
+    visual_score_chunk_size: int = 4
+    visual_score_chunk_timeout_seconds: float = 6.0
+
+    # Deferred visual re-rank for POST /api/products/match (deferred_rerank=true)
+    rerank_timeout_seconds: float = 30.0
+    rerank_result_ttl_seconds: int = 300
+    rerank_max_jobs: int = 2000
+    rerank_sse_keepalive_seconds: float = 15.0
+
+    # Tiled first-pass detection for large photos: overlapping tiles are
+    # detected concurrently alongside a downscaled overview of the whole image
+    tiled_detection: bool = False
+    tile_min_pixels: int = 8_000_000
+    tile_target_size: int = 1536
+    tile_overlap: float = 0.15
+    tile_max_tiles: int = 6
+    tile_merge_iou: float = 0.5
+
+    # Worker processes for Pillow decode/crop/resize (0 = run in a thread instead)
+    image_process_workers: int = 2
+
+    # Admission control for /api/detect and /api/products/match
+    admission_max_in_flight: int = 64
+    admission_max_queue: int = 64
+    admission_queue_timeout_seconds: float = 2.0
+    admission_retry_after_seconds: int = 2
+
+    # Load shedding: optional work is switched off in steps as the server
+    # saturates (1 skip refinement, 2 skip visual scoring, 3 stale search
+    # cache only). Each list holds one threshold per level for that signal:
+    # event-loop lag in seconds, (in-flight + queued) / admission slots, and
+    # the fullest upstream queue as a fraction of upstream_max_queue.
+    # A level is left once all signals stay under recovery_ratio of its
+    # thresholds for recovery_seconds.
+    load_shedding: bool = True
+    load_sample_interval_seconds: float = 0.5
+    load_loop_lag_thresholds: list[float] = [0.05, 0.15, 0.4]
+    load_admission_thresholds: list[float] = [0.75, 1.0, 1.5]
+    load_upstream_queue_thresholds: list[float] = [0.1, 0.25, 0.5]
+    load_recovery_ratio: float = 0.7
+    load_recovery_seconds: float = 10.0
+
+    # Request deadline budget (X-Request-Deadline-Ms overrides, capped at the max).
+    # Optional stages are skipped when less than their minimum budget remains.
+    request_deadline_seconds: float = 20.0
+    max_request_deadline_seconds: float = 60.0
+    cloud_vision_min_budget_seconds: float = 2.0
+    refine_min_budget_seconds: float = 4.0
+    fallback_search_min_budget_seconds: float = 1.5
+    visual_score_min_budget_seconds: float = 4.0
+    disconnect_poll_seconds: float = 0.5
+
+    # Per-upstream concurrency limits (excess callers queue, then fail fast)
+    gemini_max_concurrency: int = 16
+    cloud_vision_max_concurrency: int = 8
+    serper_max_concurrency: int = 16
+    image_download_max_concurrency: int = 32
+    upstream_max_queue: int = 128
+    upstream_queue_timeout_seconds: float = 5.0
 
     # Feature flags
     use_mock_detection: bool = True  # Set to False when using real Vision API
     use_mock_products: bool = True  # Set to False when using real Serper API
+    # Serve mock products from a generated catalog of this many products
+    # (0 = the sample list in data/mock_products.py). Requires numpy.
+    mock_catalog_size: int = 0
+    mock_catalog_seed: int = 0
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,135 @@
+"""
+Deterministic synthetic furniture catalog for scale testing.
+
+Products are generated as columns of small integer codes into the
+vocabularies below (plus a price column), 11 bytes per product, and
+names/URLs are only rendered for the rows a search returns. The same size
+and seed always produce the same catalog (for a given NumPy version).
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+
+# (category, typical price in USD)
+CATEGORIES = [
+    ("sofa", 1100), ("sectional sofa", 1900), ("loveseat", 800), ("armchair", 550),
+    ("chair", 180), ("dining chair", 160), ("office chair", 420), ("accent chair", 380),
+    ("bar stool", 140), ("bench", 260), ("ottoman", 220), ("coffee table", 380),
+    ("side table", 170), ("console table", 320), ("dining table", 850), ("desk", 480),
+    ("bed", 950), ("nightstand", 210), ("dresser", 780), ("wardrobe", 900),
+    ("bookshelf", 290), ("cabinet", 520), ("media console", 360), ("floor lamp", 150),
+    ("table lamp", 90), ("rug", 260), ("mirror", 180), ("headboard", 340),
+]
+
+COLORS = [
+    "white", "black", "gray", "charcoal", "beige", "cream", "ivory", "brown",
+    "walnut", "oak", "natural", "navy", "blue", "teal", "green", "olive",
+    "sage", "mustard", "yellow", "orange", "rust", "terracotta", "red", "pink",
+    "blush", "purple", "gold", "brass", "silver", "chrome",
+]
+
+# (material, price multiplier)
+MATERIALS = [
+    ("wood", 1.0), ("solid wood", 1.4), ("oak", 1.5), ("walnut", 1.7), ("pine", 0.8),
+    ("teak", 1.6), ("rattan", 0.9), ("bamboo", 0.8), ("metal", 0.9), ("steel", 1.0),
+    ("aluminum", 0.9), ("glass", 1.0), ("marble", 1.8), ("velvet", 1.2), ("linen", 1.1),
+    ("leather", 1.9), ("boucle", 1.3), ("fabric", 0.9), ("wool", 1.2), ("plastic", 0.5),
+    ("engineered wood", 0.5), ("concrete", 1.1),
+]
+
+STYLES = [
+    "modern", "mid-century modern", "scandinavian", "industrial", "farmhouse",
+    "traditional", "contemporary", "minimalist", "bohemian", "coastal", "rustic",
+    "art deco", "japandi", "glam", "transitional", "vintage",
+]
+
+# Brand popularity is skewed (Zipf-like): the first brands get most products
+BRANDS = [
+    "IKEA", "Wayfair", "West Elm", "Pottery Barn", "Crate & Barrel", "Article",
+    "CB2", "Room & Board", "Target", "Amazon", "Joybird", "Herman Miller",
+    "Design Within Reach", "Restoration Hardware", "Burrow", "Floyd", "Castlery",
+    "Anthropologie", "Urban Outfitters", "Serena & Lily", "Arhaus", "Ethan Allen",
+    "Knoll", "Hay", "Muuto", "Ligne Roset", "Blu Dot", "Interior Define",
+    "Maiden Home", "Thuma", "Uplift", "Steelcase", "Ashley", "La-Z-Boy",
+    "Sauder", "Zinus", "Novogratz", "Rivet", "Stone & Beam", "Threshold",
+]
+
+RETAILERS = [
+    "Wayfair", "Amazon", "Target", "IKEA", "West Elm", "Pottery Barn",
+    "Crate & Barrel", "Overstock", "Home Depot", "Walmart",
+]
+
+SERIES = [
+    "Harbor", "Linden", "Aspen", "Calloway", "Monroe", "Sienna", "Brooks", "Hayden",
+    "Juniper", "Marlow", "Sloane", "Wren", "Everly", "Ashby", "Rowan", "Tate",
+    "Ellison", "Porter", "Sutton", "Quinn", "Hollis", "Barrett", "Delano", "Kinsley",
+    "Mercer", "Nolan", "Oakley", "Palmer", "Reeve", "Sawyer", "Thea", "Vale",
+]
+
+# Rows are generated in fixed-size chunks to bound temporary memory;
+# part of the determinism contract, so don't change it casually
+GENERATION_CHUNK = 1_000_000
+
+
+@dataclass
+class ProductColumns:
+    """A synthetic catalog: one entry per product in each column."""
+
+    category: np.ndarray  # uint8 index into CATEGORIES
+    color: np.ndarray  # uint8 index into COLORS
+    material: np.ndarray  # uint8 index into MATERIALS
+    style: np.ndarray  # uint8 index into STYLES
+    brand: np.ndarray  # uint8 index into BRANDS
+    retailer: np.ndarray  # uint8 index into RETAILERS
+    series: np.ndarray  # uint8 index into SERIES
+    price: np.ndarray  # float32 USD
+
+    def __len__(self) -> int:
+        return len(self.category)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in vars(self).values())
+
+
+def _brand_weights() -> np.ndarray:
+    weights = 1.0 / np.arange(1, len(BRANDS) + 1)
+    return weights / weights.sum()
+
+
+def generate_catalog(size: int, seed: int = 0) -> ProductColumns:
+    """Generate `size` products deterministically from `seed`."""
+    rng = np.random.default_rng(seed)
+    columns = ProductColumns(
+        category=np.empty(size, dtype=np.uint8),
+        color=np.empty(size, dtype=np.uint8),
+        material=np.empty(size, dtype=np.uint8),
+        style=np.empty(size, dtype=np.uint8),
+        brand=np.empty(size, dtype=np.uint8),
+        retailer=np.empty(size, dtype=np.uint8),
+        series=np.empty(size, dtype=np.uint8),
+        price=np.empty(size, dtype=np.float32),
+    )
+    base_prices = np.array([price for _, price in CATEGORIES], dtype=np.float64)
+    multipliers = np.array([mult for _, mult in MATERIALS], dtype=np.float64)
+    brand_weights = _brand_weights()
+
+    for start in range(0, size, GENERATION_CHUNK):
+        stop = min(size, start + GENERATION_CHUNK)
+        n = stop - start
+        category = rng.integers(0, len(CATEGORIES), n, dtype=np.uint8)
+        material = rng.integers(0, len(MATERIALS), n, dtype=np.uint8)
+        columns.category[start:stop] = category
+        columns.material[start:stop] = material
+        columns.color[start:stop] = rng.integers(0, len(COLORS), n, dtype=np.uint8)
+        columns.style[start:stop] = rng.integers(0, len(STYLES), n, dtype=np.uint8)
+        columns.brand[start:stop] = rng.choice(len(BRANDS), n, p=brand_weights).astype(np.uint8)
+        columns.retailer[start:stop] = rng.integers(0, len(RETAILERS), n, dtype=np.uint8)
+        columns.series[start:stop] = rng.integers(0, len(SERIES), n, dtype=np.uint8)
+        # Log-normal spread around the category's typical price, scaled by material, ending in .99
+        price = base_prices[category] * multipliers[material] * rng.lognormal(0.0, 0.35, n)
+        columns.price[start:stop] = np.maximum(np.floor(price), 9.0) + 0.99
+
+    return columns
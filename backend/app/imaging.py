@@ -0,0 +1,133 @@
+"""
+CPU-bound Pillow operations run inside image-processing worker processes.
+
+This module is imported by the worker processes, so it deliberately imports
+nothing from the rest of the app (no settings, services or singletons).
+"""
+import io
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+from PIL import Image as PILImage
+
+
+def crop_jpeg(
+    image_bytes: bytes,
+    box: tuple[float, float, float, float],
+    padding: float = 0.05,
+    quality: int = 90,
+) -> bytes:
+    """Crop a normalized (x, y, width, height) region with padding and re-encode as JPEG."""
+    x, y, bw, bh = box
+    img = PILImage.open(io.BytesIO(image_bytes))
+    w, h = img.size
+
+    left = max(0, int((x - padding) * w))
+    top = max(0, int((y - padding) * h))
+    right = min(w, int((x + bw + padding) * w))
+    bottom = min(h, int((y + bh + padding) * h))
+
+    cropped = img.crop((left, top, right, bottom))
+    if cropped.mode not in ("RGB", "L"):
+        cropped = cropped.convert("RGB")
+    buf = io.BytesIO()
+    cropped.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def thumbnail_jpeg(image_bytes: bytes, max_size: int = 512, quality: int = 85) -> bytes:
+    """Downscale an image to fit within max_size x max_size and re-encode as JPEG."""
+    img = PILImage.open(io.BytesIO(image_bytes))
+    # For JPEGs, let libjpeg decode at a reduced scale (1/2, 1/4, 1/8) that is
+    # still at least max_size, instead of decoding full resolution first.
+    # A no-op for other formats.
+    img.draft("RGB", (max_size, max_size))
+    img.thumbnail((max_size, max_size))
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def crops_jpeg(
+    image_bytes: bytes,
+    boxes: list[tuple[float, float, float, float]],
+    padding: float = 0.0,
+    max_size: Optional[int] = None,
+    quality: int = 90,
+) -> list[bytes]:
+    """
+    Decode once and cut several normalized (x, y, width, height) regions as JPEGs,
+    each padded and optionally downscaled to fit max_size x max_size.
+    """
+    img = PILImage.open(io.BytesIO(image_bytes))
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    w, h = img.size
+
+    crops = []
+    for x, y, bw, bh in boxes:
+        region = (
+            max(0, int((x - padding) * w)),
+            max(0, int((y - padding) * h)),
+            min(w, int(round((x + bw + padding) * w))),
+            min(h, int(round((y + bh + padding) * h))),
+        )
+        cropped = img.crop(region)
+        if max_size:
+            cropped.thumbnail((max_size, max_size))
+        buf = io.BytesIO()
+        cropped.save(buf, format="JPEG", quality=quality)
+        crops.append(buf.getvalue())
+    return crops
+
+
+def dhash(image_bytes: bytes, hash_size: int = 8) -> int:
+    """
+    Difference hash: hash_size**2 bits, one per horizontally adjacent pixel pair
+    of a tiny grayscale thumbnail. Near-identical images differ in few bits.
+    """
+    img = PILImage.open(io.BytesIO(image_bytes))
+    img.draft("L", (hash_size * 4, hash_size * 4))
+    small = img.convert("L").resize((hash_size + 1, hash_size), PILImage.Resampling.LANCZOS)
+    pixels = small.tobytes()
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def ping() -> bool:
+    """No-op used to start workers (and import Pillow in them) ahead of traffic."""
+    return True
+
+
+OPERATIONS = {
+    "crop": crop_jpeg,
+    "thumbnail": thumbnail_jpeg,
+    "crops": crops_jpeg,
+    "dhash": dhash,
+}
+
+
+def run_operation(op: str, image_bytes: bytes, args: tuple):
+    """Run a named operation on bytes passed directly (pickled) to the worker."""
+    return OPERATIONS[op](image_bytes, *args)
+
+
+def run_operation_shared(op: str, shm_name: str, size: int, args: tuple):
+    """Run a named operation on image bytes read from a shared memory block."""
+    # Workers share the parent's resource tracker, and the parent unlinks the block
+    shm = SharedMemory(name=shm_name)
+    try:
+        view = shm.buf[:size]
+        try:
+            image_bytes = bytes(view)
+        finally:
+            view.release()
+    finally:
+        shm.close()
+    return OPERATIONS[op](image_bytes, *args)
@@ -1,24 +1,58 @@
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 
 from .config import get_settings
-from .routers import detection_router, products_router
+from .middleware import AdmissionMiddleware, BodySizeLimitMiddleware, RequestIdMiddleware
+from .routers import detection_router, products_router, admin_router
+from .routers.detection import vision_service
+from .routers.products import image_similarity_service, product_service
+from .services.concurrency import admission_controller
+from .services.metrics import metrics
+from .services.image_processing import image_processor
+from .services.log import setup_logging, stop_logging
+from .services.load import load_controller
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     settings = get_settings()
-    print(f"Starting {settings.app_name}...")
-    print(f"Debug mode: {settings.debug}")
-    print(f"Mock detection: {settings.use_mock_detection}")
-    print(f"Mock products: {settings.use_mock_products}")
+    setup_logging(
+        settings.log_level,
+        json_format=settings.log_json,
+        queue_size=settings.log_queue_size,
+        sample_window_seconds=settings.log_sample_window_seconds,
+        sample_burst=settings.log_sample_burst,
+    )
     gemini_model = settings.gemini_pro_model if settings.use_gemini_pro else settings.gemini_model
-    print(f"Gemini model: {gemini_model}")
+    logger.info(
+        "Starting %s (debug=%s, mock detection=%s, mock products=%s, Gemini model=%s)",
+        settings.app_name, settings.debug, settings.use_mock_detection,
+        settings.use_mock_products, gemini_model,
+    )
+    await image_processor.warm_up()
+    await product_service.load_catalog()
+    try:
+        await vision_service.warm_up()
+        await image_similarity_service.warm_up()
+    except Exception as e:
+        logger.warning("Gemini template warm-up failed, templates will build on first use: %s", e)
+    # Warm the exact-match search cache in the background (doesn't delay startup)
+    product_service.start_background_refresh()
+    load_controller.start()
     yield
     # Shutdown
-    print("Shutting down...")
+    logger.info("Shutting down...")
+    await load_controller.stop()
+    await product_service.stop_background_refresh()
+    await product_service.save_product_index()
+    image_processor.shutdown()
+    stop_logging()
 
 
 settings = get_settings()
@@ -30,18 +64,33 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-# Configure CORS
+# Reject oversized uploads while they stream in, before they are buffered
+app.add_middleware(BodySizeLimitMiddleware, max_body_bytes=settings.max_upload_bytes)
+
+# Shed load on the scan endpoints before their bodies are read
+app.add_middleware(
+    AdmissionMiddleware,
+    limiter=admission_controller,
+    paths={"/api/detect", "/api/products/match"},
+)
+
+# Request ids for log correlation (wraps the size limit so 413s get one too)
+app.add_middleware(RequestIdMiddleware)
+
+# Configure CORS (added last so it wraps every other middleware, including 413s)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID"],
 )
 
 # Include routers
 app.include_router(detection_router)
 app.include_router(products_router)
+app.include_router(admin_router)
 
 
 @app.get("/health", tags=["health"])
@@ -54,6 +103,15 @@ async def health_check():
     }
 
 
+@app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+async def metrics_endpoint() -> PlainTextResponse:
+    """Per-stage latency histograms and counters in Prometheus text format."""
+    return PlainTextResponse(
+        metrics.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 @app.get("/", tags=["root"])
 async def root():
     """Root endpoint with API information."""
@@ -62,4 +120,5 @@ async def root():
         "version": "1.0.0",
         "docs": "/docs",
         "health": "/health",
+        "metrics": "/metrics",
     }
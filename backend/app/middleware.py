@@ -0,0 +1,149 @@
+import re
+import uuid
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .services.concurrency import ConcurrencyLimiter, OverloadedError
+from .services.log import request_id_var
+from .services.metrics import metrics
+
+
+# Headroom for multipart boundaries and form-field headers around the file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Client-supplied request ids are reused only if they look like ids
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+
+class RequestIdMiddleware:
+    """
+    Give every request an id for log correlation.
+
+    Reuses a well-formed X-Request-ID from the client (or proxy), otherwise
+    generates one. The id is set in a context variable the logging pipeline
+    stamps on each record, and echoed in the X-Request-ID response header.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        supplied = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        request_id = supplied if REQUEST_ID_PATTERN.fullmatch(supplied) else uuid.uuid4().hex
+
+        async def send_with_id(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
+
+
+class BodySizeLimitMiddleware:
+    """
+    Reject request bodies larger than `max_body_bytes` while they stream in.
+
+    Requests that declare a too-large Content-Length are refused before any
+    of the body is read. Chunked or lying clients are cut off as soon as the
+    running byte count passes the cap, instead of after the whole body has
+    been buffered and parsed.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_bytes: int):
+        self.app = app
+        self.max_body_bytes = max_body_bytes + MULTIPART_OVERHEAD_BYTES
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit():
+            if int(content_length) > self.max_body_bytes:
+                metrics.inc("upload_rejected_total", reason="content_length")
+                response = JSONResponse(self._detail(), status_code=413)
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    metrics.inc("upload_rejected_total", reason="streamed_size")
+                    # Surfaces through FastAPI's body parsing as a normal 413 response
+                    raise HTTPException(status_code=413, detail=self._detail()["detail"])
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _detail(self) -> dict:
+        limit_mb = (self.max_body_bytes - MULTIPART_OVERHEAD_BYTES) // (1024 * 1024)
+        return {"detail": f"File too large. Maximum size is {limit_mb}MB."}
+
+
+class AdmissionMiddleware:
+    """
+    Global admission control for the expensive scan endpoints.
+
+    Requests to `paths` hold a slot of `limiter` until their response has
+    been sent. When the server is saturated and the wait queue is full (or
+    the wait times out), they get 503 with a Retry-After hint straight away,
+    before any of the body (e.g. a photo upload) is read.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: ConcurrencyLimiter, paths: set[str]):
+        self.app = app
+        self.limiter = limiter
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.limiter.acquire()
+        except OverloadedError as e:
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry shortly."},
+                status_code=503,
+                headers={"Retry-After": str(int(e.retry_after))},
+            )
+            await response(scope, receive, send)
+            return
+
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.limiter.release()
+
+        async def send_and_release(message: Message):
+            await send(message)
+            # Background tasks run after the last body chunk; they don't hold the slot
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                release()
+
+        try:
+            await self.app(scope, receive, send_and_release)
+        finally:
+            release()
+
+
+metrics.describe("upload_rejected_total", "Uploads rejected before processing, by reason.")
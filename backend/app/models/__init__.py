@@ -3,15 +3,20 @@ from .detection import (
     DetectedFurniture,
     DetectionRequest,
     DetectionResponse,
+    ImageLookupRequest,
+    ImageLookupResponse,
 )
-from .product import ProductMatch, ProductMatchRequest, ProductMatchResponse
+from .product import ProductMatch, ProductMatchRequest, ProductMatchResponse, RerankResponse
 
 __all__ = [
     "BoundingBox",
     "DetectedFurniture",
     "DetectionRequest",
     "DetectionResponse",
+    "ImageLookupRequest",
+    "ImageLookupResponse",
     "ProductMatch",
     "ProductMatchRequest",
     "ProductMatchResponse",
+    "RerankResponse",
 ]
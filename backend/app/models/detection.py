@@ -36,4 +36,24 @@ class DetectionResponse(BaseModel):
         default_factory=list, description="List of detected furniture items"
     )
     session_id: Optional[str] = Field(None, description="Session ID for image-based visual matching")
+    image_hash: Optional[str] = Field(None, description="SHA-256 of the uploaded image bytes")
+    cached: bool = Field(False, description="Whether detections were served from an earlier upload of the same image")
     error: Optional[str] = Field(None, description="Error message if any")
+    timings: Optional[dict[str, float]] = Field(
+        None, description="Per-stage durations in ms (only when debug_timing is requested)"
+    )
+
+
+class ImageLookupRequest(BaseModel):
+    image_hash: str = Field(
+        ..., pattern=r"^[0-9a-f]{64}$", description="Lowercase hex SHA-256 of the image bytes"
+    )
+
+
+class ImageLookupResponse(BaseModel):
+    found: bool = Field(..., description="Whether the server already holds this image; upload it if false")
+    image_hash: str = Field(..., description="The hash that was looked up")
+    session_id: Optional[str] = Field(None, description="Existing session ID for visual matching")
+    detections: list[DetectedFurniture] = Field(
+        default_factory=list, description="Cached detections for the image"
+    )
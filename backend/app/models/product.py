@@ -4,7 +4,12 @@ from typing import Optional
 
 class ProductMatchRequest(BaseModel):
     session_id: str = Field(..., description="Image session ID from detection response")
-    bounding_box: dict = Field(..., description="Bounding box of the furniture item {x, y, width, height}")
+    detection_id: Optional[str] = Field(
+        None, description="Detection ID from the detection response (uses its stored reference crop)"
+    )
+    bounding_box: Optional[dict] = Field(
+        None, description="Bounding box of the furniture item {x, y, width, height}, used without detection_id"
+    )
     category: str = Field(..., description="Furniture category")
     description: Optional[str] = Field(None, description="Furniture description")
     identified_product: Optional[str] = Field(None, description="Identified product name")
@@ -14,6 +19,11 @@ class ProductMatchRequest(BaseModel):
     brand: Optional[str] = Field(None, description="Brand name")
     model_name: Optional[str] = Field(None, description="Model name")
     limit: int = Field(default=6, ge=1, le=20, description="Max products to return")
+    deferred_rerank: bool = Field(
+        False,
+        description="Return text-ranked results immediately with a rerank_token; "
+        "fetch the visual re-rank from /api/products/match/rerank/{token}",
+    )
 
 
 class ProductMatch(BaseModel):
@@ -41,3 +51,20 @@ class ProductMatchResponse(BaseModel):
     identified_product: Optional[str] = Field(None, description="Identified product name echoed back")
     category: Optional[str] = Field(None, description="Searched category")
     error: Optional[str] = Field(None, description="Error message if any")
+    rerank_token: Optional[str] = Field(
+        None, description="Token for the pending visual re-rank (deferred_rerank requests only)"
+    )
+    timings: Optional[dict[str, float]] = Field(
+        None, description="Per-stage durations in ms (only when debug_timing is requested)"
+    )
+
+
+class RerankResponse(BaseModel):
+    rerank_token: str = Field(..., description="Token from the match response")
+    status: str = Field(..., description="pending, ready, or failed (text ranking is returned)")
+    products: list[ProductMatch] = Field(
+        default_factory=list, description="Re-ranked products (exact + similar), empty while pending"
+    )
+    exact_products: list[ProductMatch] = Field(default_factory=list, description="Re-ranked exact matches")
+    similar_products: list[ProductMatch] = Field(default_factory=list, description="Re-ranked similar products")
+    error: Optional[str] = Field(None, description="Why the visual re-rank failed, if it did")
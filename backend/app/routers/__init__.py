@@ -1,4 +1,5 @@
 from .detection import router as detection_router
 from .products import router as products_router
+from .admin import router as admin_router
 
-__all__ = ["detection_router", "products_router"]
+__all__ = ["detection_router", "products_router", "admin_router"]
@@ -0,0 +1,56 @@
+import asyncio
+import secrets
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from ..config import get_settings
+from ..services.profiler import profiler, ProfilerBusyError
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """Guard admin endpoints with the ADMIN_TOKEN shared secret."""
+    settings = get_settings()
+    if not settings.admin_token:
+        # Admin endpoints are disabled entirely when no token is configured
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@router.post(
+    "/profile",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(require_admin)],
+)
+async def run_profile(
+    seconds: float = Query(default=10.0, gt=0, description="How long to sample for"),
+    interval_ms: float = Query(default=10.0, ge=1, le=1000, description="Sampling interval in milliseconds"),
+    include_idle: bool = Query(
+        default=False,
+        description="Keep samples of threads parked in select/wait (idle event loop, idle workers)",
+    ),
+) -> PlainTextResponse:
+    """
+    Sample every thread in this worker for N seconds.
+
+    Covers the event loop thread and executor threads. Returns collapsed stacks
+    (`thread;frame;...;leaf count`) ready for flamegraph.pl or speedscope.
+    """
+    settings = get_settings()
+    if seconds > settings.max_profile_seconds:
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds must be <= {settings.max_profile_seconds}",
+        )
+
+    try:
+        # Sample from a worker thread so the event loop keeps serving (and being profiled)
+        collapsed, samples = await asyncio.to_thread(
+            profiler.profile, seconds, interval_ms / 1000, include_idle
+        )
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return PlainTextResponse(collapsed, headers={"X-Profile-Samples": str(samples)})
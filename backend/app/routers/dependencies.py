@@ -0,0 +1,54 @@
+import asyncio
+from typing import Awaitable, Optional, TypeVar
+from fastapi import Header, Request
+from ..config import get_settings
+from ..services.deadline import start_deadline
+from ..services.metrics import metrics
+
+T = TypeVar("T")
+
+
+class ClientDisconnectedError(Exception):
+    """Raised when the client goes away before the response is ready."""
+
+
+async def request_deadline(
+    x_request_deadline_ms: Optional[int] = Header(
+        default=None,
+        ge=1,
+        description="Client-side time budget in ms; optional stages are skipped as it runs out",
+    ),
+):
+    """Start the request deadline from the header, falling back to the configured default."""
+    settings = get_settings()
+    seconds = settings.request_deadline_seconds
+    if x_request_deadline_ms:
+        seconds = min(x_request_deadline_ms / 1000, settings.max_request_deadline_seconds)
+    if seconds > 0:
+        start_deadline(seconds)
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[T]) -> T:
+    """
+    Await `work`, cancelling it as soon as the client disconnects.
+
+    The work runs as a task (inheriting the request's timing and deadline
+    context) while the handler polls for the disconnect.
+    """
+    poll_interval = get_settings().disconnect_poll_seconds
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                metrics.inc("requests_cancelled_total", reason="client_disconnected")
+                raise ClientDisconnectedError("Client disconnected")
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+
+metrics.describe("requests_cancelled_total", "Requests whose pipeline work was cancelled, by reason.")
@@ -1,24 +1,65 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from ..models.detection import DetectionResponse
+import logging
+from fastapi import (
+    APIRouter, BackgroundTasks, Depends, UploadFile, File, HTTPException, Query, Request, Response
+)
+from fastapi.concurrency import run_in_threadpool
+from ..models.detection import DetectionResponse, ImageLookupRequest, ImageLookupResponse
 from ..services.vision_service import VisionService
-from ..services.image_store import image_store
+from ..services.image_store import image_store, hash_image
+from ..services.metrics import metrics
+from ..services.timing import ModelJSONResponse, start_request_timing, timed_response
+from ..services.uploads import inspect_image_header, InvalidImageError
+from ..config import get_settings
+from .dependencies import cancel_on_disconnect, request_deadline
+from .products import product_service, image_similarity_service
 
-router = APIRouter(prefix="/api", tags=["detection"])
+logger = logging.getLogger(__name__)
 
+router = APIRouter(prefix="/api", tags=["detection"], default_response_class=ModelJSONResponse)
+
+settings = get_settings()
 vision_service = VisionService()
 
+# Stop speculative match searches for photos nobody can ask about any more
+image_store.add_expiry_listener(product_service.cancel_session_prefetches)
+
 
-@router.post("/detect", response_model=DetectionResponse)
+async def _store_reference_crops(session_id: str, image_bytes: bytes, detections: list):
+    """Cut every detection's reference crop from one decode and keep it with the session."""
+    try:
+        with metrics.track("reference_crops"):
+            crops = await image_similarity_service.reference_crops(image_bytes, detections)
+        image_store.set_crops(session_id, crops)
+    except Exception as e:
+        logger.warning("Reference crop precompute failed, matching will crop on demand: %s", e)
+
+
+@router.post(
+    "/detect",
+    response_model=DetectionResponse,
+    dependencies=[Depends(request_deadline)],
+)
 async def detect_furniture(
-    image: UploadFile = File(..., description="Image file to analyze")
-) -> DetectionResponse:
+    request: Request,
+    background_tasks: BackgroundTasks,
+    image: UploadFile = File(..., description="Image file to analyze"),
+    debug_timing: bool = Query(
+        default=False,
+        description="Include the per-stage timing breakdown in the response body",
+    ),
+) -> Response:
     """
     Detect furniture in an uploaded image.
 
     Accepts JPEG, PNG, or WebP images.
     Returns a list of detected furniture items with bounding boxes
     and a session_id for visual similarity matching.
+    The response carries a Server-Timing header with per-stage durations.
+    Optional stages are skipped as the X-Request-Deadline-Ms budget runs out,
+    and all work is cancelled if the client disconnects.
     """
+    timing = start_request_timing()
+
     # Validate file type
     allowed_types = ["image/jpeg", "image/png", "image/webp"]
     if image.content_type not in allowed_types:
@@ -27,27 +68,107 @@ async def detect_furniture(
             detail=f"Invalid file type. Allowed: {', '.join(allowed_types)}",
         )
 
-    # Validate file size (max 10MB)
-    max_size = 10 * 1024 * 1024  # 10MB
-    content = await image.read()
+    # Validate file size from the spooled upload, before reading it into memory.
+    # The body itself is capped while streaming by BodySizeLimitMiddleware.
+    max_size = settings.max_upload_bytes
+    if image.size is not None and image.size > max_size:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File too large. Maximum size is {max_size // (1024 * 1024)}MB.",
+        )
+
+    with metrics.track("decode", timing="decode"):
+        # Check format and dimensions from the image header only
+        try:
+            await run_in_threadpool(inspect_image_header, image.file)
+        except InvalidImageError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        content = await image.read()
     if len(content) > max_size:
         raise HTTPException(
             status_code=400,
-            detail="File too large. Maximum size is 10MB.",
+            detail=f"File too large. Maximum size is {max_size // (1024 * 1024)}MB.",
+        )
+
+    image_hash = await run_in_threadpool(hash_image, content)
+
+    # Same bytes uploaded again (e.g. a rescan): reuse the earlier results
+    cached = image_store.find_by_hash(image_hash)
+    if cached is not None and cached[1].detections is not None:
+        metrics.inc("image_lookup_total", endpoint="detect", result="hit")
+        session_id, session = cached
+        product_service.prefetch_matches(session_id, session.detections)
+        if session.detections and not session.crops and session.image_bytes is not None:
+            background_tasks.add_task(
+                _store_reference_crops, session_id, session.image_bytes, session.detections
+            )
+        response = DetectionResponse(
+            success=True,
+            detections=session.detections,
+            session_id=session_id,
+            image_hash=image_hash,
+            cached=True,
         )
+        return timed_response(response, timing, include_debug=debug_timing)
+    metrics.inc("image_lookup_total", endpoint="detect", result="miss")
 
     try:
-        detections = await vision_service.detect_furniture(content)
+        detections = await cancel_on_disconnect(request, vision_service.detect_furniture(content))
 
         # Store image for later visual similarity matching
-        session_id = image_store.store(content)
+        session_id = image_store.store(content, image_hash)
         if session_id is None:
-            print("Image store full, visual matching will be unavailable for this request")
+            logger.warning("Image store full, visual matching will be unavailable for this request")
+        else:
+            image_store.set_detections(session_id, detections)
+            if detections:
+                # After the response: crops let /match skip decoding the original
+                background_tasks.add_task(_store_reference_crops, session_id, content, detections)
 
-        return DetectionResponse(success=True, detections=detections, session_id=session_id)
+        # The client asks for matches for every detection next; start those now
+        product_service.prefetch_matches(session_id, detections)
+
+        response = DetectionResponse(
+            success=True, detections=detections, session_id=session_id, image_hash=image_hash
+        )
     except Exception as e:
-        return DetectionResponse(
+        response = DetectionResponse(
             success=False,
             detections=[],
             error=str(e),
         )
+
+    return timed_response(response, timing, include_debug=debug_timing)
+
+
+@router.post("/detect/lookup", response_model=ImageLookupResponse)
+async def lookup_image(request: ImageLookupRequest, background_tasks: BackgroundTasks) -> ModelJSONResponse:
+    """
+    Upload-once protocol: check whether the server already holds an image.
+
+    Clients send the SHA-256 of the photo before uploading it. If the image is
+    still stored (e.g. a rescan of the same photo), the existing session_id and
+    cached detections are returned and the upload can be skipped entirely.
+    Otherwise `found` is false and the client should POST the bytes to /api/detect.
+    """
+    cached = image_store.find_by_hash(request.image_hash)
+    if cached is None or cached[1].detections is None:
+        metrics.inc("image_lookup_total", endpoint="lookup", result="miss")
+        return ModelJSONResponse(ImageLookupResponse(found=False, image_hash=request.image_hash))
+
+    metrics.inc("image_lookup_total", endpoint="lookup", result="hit")
+    session_id, session = cached
+    product_service.prefetch_matches(session_id, session.detections)
+    if session.detections and not session.crops and session.image_bytes is not None:
+        background_tasks.add_task(
+            _store_reference_crops, session_id, session.image_bytes, session.detections
+        )
+    return ModelJSONResponse(
+        ImageLookupResponse(
+            found=True,
+            image_hash=request.image_hash,
+            session_id=session_id,
+            detections=session.detections,
+        )
+    )
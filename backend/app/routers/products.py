@@ -1,18 +1,119 @@
-from typing import Optional
-from fastapi import APIRouter, Query
-from ..models.product import ProductMatchResponse, ProductMatchRequest
+import logging
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from ..models.product import ProductMatch, ProductMatchResponse, ProductMatchRequest, RerankResponse
 from ..services.product_service import ProductService
 from ..services.image_store import image_store
 from ..services.image_similarity import ImageSimilarityService
+from ..services.rerank import RerankJob, rerank_jobs
+from ..services.metrics import metrics
+from ..services.timing import ModelJSONResponse, start_request_timing, timed_response
+from ..services.deadline import has_budget
+from ..services.load import SKIP_VISUAL_SCORE, load_controller
+from ..config import get_settings
+from .dependencies import (
+    cancel_on_disconnect,
+    request_deadline,
+    ClientDisconnectedError,
+)
 
-router = APIRouter(prefix="/api/products", tags=["products"])
+logger = logging.getLogger(__name__)
 
+router = APIRouter(
+    prefix="/api/products", tags=["products"], default_response_class=ModelJSONResponse
+)
+
+settings = get_settings()
 product_service = ProductService()
 image_similarity_service = ImageSimilarityService()
 
 
-@router.get("/match", response_model=ProductMatchResponse)
+async def _reference_crop(request: ProductMatchRequest) -> Optional[bytes]:
+    """
+    The reference crop for a match request.
+
+    Uses the crop stored at detect time when the request names a detection,
+    and only otherwise decodes the original (if still held) for bounding_box.
+    """
+    session = image_store.get_session(request.session_id)
+    if session is not None and request.detection_id in session.crops:
+        metrics.inc("image_store_lookups_total", result="crop")
+        return session.crops[request.detection_id]
+
+    stored_image = session.image_bytes if session is not None else None
+    if stored_image is None or not request.bounding_box:
+        metrics.inc("image_store_lookups_total", result="miss")
+        return None
+
+    metrics.inc("image_store_lookups_total", result="original")
+    with metrics.track("decode", timing="decode"):
+        return await image_similarity_service.crop_furniture(stored_image, request.bounding_box)
+
+
+async def _score_visually(request: ProductMatchRequest, products: list[ProductMatch]) -> dict[int, float]:
+    """Get the reference crop, download product images and score them with Gemini."""
+    cropped_ref = await _reference_crop(request)
+    if cropped_ref is None:
+        return {}
+
+    # Download product images in parallel
+    product_image_urls = [p.imageUrl for p in products]
+    product_images = await image_similarity_service.download_product_images(product_image_urls)
+
+    # Score visual similarity
+    product_names = [p.name for p in products]
+    return await image_similarity_service.score_visual_similarity(
+        cropped_ref, product_images, product_names
+    )
+
+
+async def _rerank(
+    request: ProductMatchRequest,
+    exact_products: list[ProductMatch],
+    similar_products: list[ProductMatch],
+) -> tuple[list[ProductMatch], list[ProductMatch]]:
+    """Re-order text-ranked matches by visual similarity, keeping the exact/similar split."""
+    all_products = exact_products + similar_products
+    visual_scores = await _score_visually(request, all_products)
+
+    # Update similarity scores with visual scores
+    for idx, product in enumerate(all_products):
+        if idx in visual_scores:
+            product.similarity = visual_scores[idx]
+
+    # Re-sort by similarity
+    all_products.sort(key=lambda p: p.similarity, reverse=True)
+
+    # Re-split into exact and similar
+    exact_set = {p.id for p in exact_products}
+    return (
+        [p for p in all_products if p.id in exact_set],
+        [p for p in all_products if p.id not in exact_set],
+    )
+
+
+def _start_rerank(
+    request: ProductMatchRequest,
+    exact_products: list[ProductMatch],
+    similar_products: list[ProductMatch],
+) -> RerankJob:
+    """Re-rank copies in the background; the text-ranked lists go out in the response unchanged."""
+    exact_copies = [p.model_copy() for p in exact_products]
+    similar_copies = [p.model_copy() for p in similar_products]
+    return rerank_jobs.start(
+        _rerank(request, exact_copies, similar_copies),
+        fallback=(exact_products, similar_products),
+    )
+
+
+@router.get(
+    "/match",
+    response_model=ProductMatchResponse,
+    dependencies=[Depends(request_deadline)],
+)
 async def get_product_matches(
+    http_request: Request,
     category: str = Query(
         ...,
         min_length=1,
@@ -52,20 +153,29 @@ async def get_product_matches(
         le=20,
         description="Maximum number of products to return per category",
     ),
-) -> ProductMatchResponse:
+    debug_timing: bool = Query(
+        default=False,
+        description="Include the per-stage timing breakdown in the response body",
+    ),
+) -> Response:
     """
     Get product matches for a furniture category.
 
     Returns exact matches (when identified_product is provided) and similar alternatives.
     The `products` field contains all results concatenated for backward compatibility.
+    The response carries a Server-Timing header with per-stage durations.
     """
+    timing = start_request_timing()
     try:
-        exact_products, similar_products = await product_service.get_matches_with_exact(
-            category, limit, description, identified_product,
-            color=color, material=material, style=style,
-            brand=brand, model_name=model_name,
+        exact_products, similar_products = await cancel_on_disconnect(
+            http_request,
+            product_service.get_matches_with_exact(
+                category, limit, description, identified_product,
+                color=color, material=material, style=style,
+                brand=brand, model_name=model_name,
+            ),
         )
-        return ProductMatchResponse(
+        response = ProductMatchResponse(
             success=True,
             products=exact_products + similar_products,
             exact_products=exact_products,
@@ -74,7 +184,7 @@ async def get_product_matches(
             category=category,
         )
     except Exception as e:
-        return ProductMatchResponse(
+        response = ProductMatchResponse(
             success=False,
             products=[],
             exact_products=[],
@@ -83,70 +193,75 @@ async def get_product_matches(
             error=str(e),
         )
 
+    return timed_response(response, timing, include_debug=debug_timing)
+
 
-@router.post("/match", response_model=ProductMatchResponse)
-async def post_product_matches(request: ProductMatchRequest) -> ProductMatchResponse:
+@router.post(
+    "/match",
+    response_model=ProductMatchResponse,
+    dependencies=[Depends(request_deadline)],
+)
+async def post_product_matches(
+    http_request: Request,
+    request: ProductMatchRequest,
+    debug_timing: bool = Query(
+        default=False,
+        description="Include the per-stage timing breakdown in the response body",
+    ),
+) -> Response:
     """
     Get product matches with visual similarity scoring.
 
-    Uses the stored image (from detection session_id) to visually compare
-    the detected furniture against product listing images.
+    Uses the reference crop stored for detection_id at detect time (or crops
+    the stored image with bounding_box) to visually compare the detected
+    furniture against product listing images.
     Falls back to text-based matching if visual scoring is unavailable.
+    With deferred_rerank, the text-ranked results are returned right away with
+    a rerank_token and the visual re-rank runs in the background; fetch it from
+    GET /match/rerank/{token} or its /events stream.
+    The response carries a Server-Timing header with per-stage durations.
     """
+    timing = start_request_timing()
+    rerank_token = None
     try:
         # Step 1: Get text-based product matches (same as GET flow)
-        exact_products, similar_products = await product_service.get_matches_with_exact(
-            request.category, request.limit, request.description, request.identified_product,
-            color=request.color, material=request.material, style=request.style,
-            brand=request.brand, model_name=request.model_name,
+        exact_products, similar_products = await cancel_on_disconnect(
+            http_request,
+            product_service.get_matches_with_exact(
+                request.category, request.limit, request.description, request.identified_product,
+                color=request.color, material=request.material, style=request.style,
+                brand=request.brand, model_name=request.model_name,
+            ),
+        )
+        rerank = bool(exact_products or similar_products) and not load_controller.sheds(
+            SKIP_VISUAL_SCORE, "visual_score"
         )
-        all_products = exact_products + similar_products
 
-        # Step 2: Try visual similarity scoring
-        stored_image = image_store.get(request.session_id)
-        if stored_image and all_products:
+        # Step 2: Visual similarity scoring, either in the background (deferred_rerank)
+        # or inline (optional: skipped when the deadline is close or under load)
+        if rerank and request.deferred_rerank:
+            rerank_token = _start_rerank(request, exact_products, similar_products).token
+        elif rerank and has_budget("visual_score", settings.visual_score_min_budget_seconds):
             try:
-                # Crop the furniture from the stored image
-                cropped_ref = image_similarity_service.crop_furniture(
-                    stored_image, request.bounding_box
+                exact_products, similar_products = await cancel_on_disconnect(
+                    http_request, _rerank(request, exact_products, similar_products)
                 )
-
-                # Download product images in parallel
-                product_image_urls = [p.imageUrl for p in all_products]
-                product_images = await image_similarity_service.download_product_images(product_image_urls)
-
-                # Score visual similarity
-                product_names = [p.name for p in all_products]
-                visual_scores = await image_similarity_service.score_visual_similarity(
-                    cropped_ref, product_images, product_names
-                )
-
-                # Update similarity scores with visual scores
-                for idx, product in enumerate(all_products):
-                    if idx in visual_scores:
-                        product.similarity = visual_scores[idx]
-
-                # Re-sort by similarity
-                all_products.sort(key=lambda p: p.similarity, reverse=True)
-
-                # Re-split into exact and similar
-                exact_set = {p.id for p in exact_products}
-                exact_products = [p for p in all_products if p.id in exact_set]
-                similar_products = [p for p in all_products if p.id not in exact_set]
-
+            except ClientDisconnectedError:
+                raise
             except Exception as e:
-                print(f"Visual similarity scoring failed, using text-based scores: {e}")
+                logger.warning("Visual similarity scoring failed, using text-based scores: %s", e)
 
-        return ProductMatchResponse(
+        response = ProductMatchResponse(
             success=True,
             products=exact_products + similar_products,
             exact_products=exact_products,
             similar_products=similar_products,
             identified_product=request.identified_product,
             category=request.category,
+            rerank_token=rerank_token,
         )
     except Exception as e:
-        return ProductMatchResponse(
+        response = ProductMatchResponse(
             success=False,
             products=[],
             exact_products=[],
@@ -154,3 +269,58 @@ async def post_product_matches(request: ProductMatchRequest) -> ProductMatchResp
             category=request.category,
             error=str(e),
         )
+
+    return timed_response(response, timing, include_debug=debug_timing)
+
+
+def _get_rerank_job(token: str) -> RerankJob:
+    job = rerank_jobs.get(token)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired rerank token")
+    return job
+
+
+@router.get("/match/rerank/{token}", response_model=RerankResponse)
+async def get_rerank(
+    token: str = Path(..., description="rerank_token from a deferred POST /match"),
+    wait_ms: int = Query(
+        default=0,
+        ge=0,
+        le=30_000,
+        description="Long-poll: wait up to this long for a pending re-rank to finish",
+    ),
+) -> Response:
+    """
+    Visually re-ranked results for a deferred match request.
+
+    status is "pending" until the re-rank finishes, then "ready"; "failed"
+    carries the original text ranking and the error.
+    """
+    job = _get_rerank_job(token)
+    if wait_ms:
+        await job.wait(wait_ms / 1000)
+    return ModelJSONResponse(job.as_response())
+
+
+@router.get("/match/rerank/{token}/events")
+async def stream_rerank(
+    token: str = Path(..., description="rerank_token from a deferred POST /match"),
+) -> StreamingResponse:
+    """
+    Server-sent events stream for a deferred re-rank.
+
+    Sends keepalive comments while the re-rank is pending, then a single
+    `rerank` event whose data is the RerankResponse JSON, and closes.
+    """
+    job = _get_rerank_job(token)
+
+    async def events() -> AsyncIterator[str]:
+        while not await job.wait(settings.rerank_sse_keepalive_seconds):
+            yield ": keepalive\n\n"
+        yield f"event: rerank\ndata: {job.as_response().model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
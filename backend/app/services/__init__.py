@@ -2,5 +2,6 @@ from .vision_service import VisionService
 from .product_service import ProductService
 from .image_store import image_store
 from .image_similarity import ImageSimilarityService
+from .metrics import metrics
 
-__all__ = ["VisionService", "ProductService", "image_store", "ImageSimilarityService"]
+__all__ = ["VisionService", "ProductService", "image_store", "ImageSimilarityService", "metrics"]
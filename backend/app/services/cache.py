@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Generic, Hashable, Optional, TypeVar
+from .metrics import metrics
+
+V = TypeVar("V")
+
+
+@dataclass
+class CacheEntry(Generic[V]):
+    value: V
+    stored_at: float
+
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+
+class TTLCache(Generic[V]):
+    """
+    Bounded LRU cache whose entries expire after `ttl_seconds`.
+
+    Expired entries are kept for another `stale_seconds` and can still be
+    served by callers that ask for them (allow_stale=True), e.g. when the
+    upstream is down or the service is shedding load. Only used from the
+    event loop, so no locking. Lookups are counted per cache and result.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float, stale_seconds: float = 0.0):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.stale = stale_seconds
+        self._entries: OrderedDict[Hashable, CacheEntry[V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, allow_stale: bool = False) -> Optional[V]:
+        """The cached value, or None if missing, expired (unless allowed) or too old."""
+        entry = self._entries.get(key)
+        result = "miss"
+        value = None
+        if entry is not None:
+            age = entry.age()
+            if age <= self.ttl:
+                result, value = "hit", entry.value
+            elif age > self.ttl + self.stale:
+                self._remove(key)
+            elif allow_stale:
+                result, value = "stale", entry.value
+
+        if value is not None:
+            self._entries.move_to_end(key)
+        metrics.inc("cache_lookups_total", cache=self.name, result=result)
+        return value
+
+    def age(self, key: Hashable) -> Optional[float]:
+        """Seconds since the entry was stored, or None if absent."""
+        entry = self._entries.get(key)
+        return entry.age() if entry is not None else None
+
+    def set(self, key: Hashable, value: V):
+        """Store a value, evicting the least recently used entry when full."""
+        self._entries[key] = CacheEntry(value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._publish()
+
+    def _remove(self, key: Hashable):
+        self._entries.pop(key, None)
+        self._publish()
+
+    def _publish(self):
+        metrics.set_gauge("cache_entries", len(self._entries), cache=self.name)
+
+
+metrics.describe("cache_lookups_total", "Cache lookups, by cache and result (hit/stale/miss).")
+metrics.describe("cache_entries", "Entries held, by cache.")
@@ -0,0 +1,161 @@
+import logging
+import re
+import time
+from typing import Optional
+
+import numpy as np
+
+from ..data.synthetic_catalog import (
+    BRANDS,
+    CATEGORIES,
+    COLORS,
+    MATERIALS,
+    RETAILERS,
+    SERIES,
+    STYLES,
+    ProductColumns,
+    generate_catalog,
+)
+from ..models.product import ProductMatch
+from .retailers.base import calculate_similarity
+from .metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+# Score added when the query names a product's attribute
+MATCH_WEIGHTS = {"brand": 4, "style": 3, "material": 2, "color": 2}
+
+CATEGORY_NAMES = [name for name, _ in CATEGORIES]
+MATERIAL_NAMES = [name for name, _ in MATERIALS]
+
+
+def _term_patterns(vocabulary: list[str]) -> list[re.Pattern]:
+    return [re.compile(rf"(?<!\w){re.escape(term.lower())}(?!\w)") for term in vocabulary]
+
+
+# Whole-word patterns for the attributes a query can name
+QUERY_TERMS = {
+    "brand": _term_patterns(BRANDS),
+    "style": _term_patterns(STYLES),
+    "material": _term_patterns(MATERIAL_NAMES),
+    "color": _term_patterns(COLORS),
+}
+
+
+def _mentioned(query: str) -> dict[str, list[int]]:
+    """Per attribute, the codes of the vocabulary terms the query mentions."""
+    normalized = query.lower()
+    return {
+        field: [code for code, pattern in enumerate(patterns) if pattern.search(normalized)]
+        for field, patterns in QUERY_TERMS.items()
+    }
+
+
+class CatalogStore:
+    """
+    Columnar, in-memory product catalog for mock-mode search at scale.
+
+    Rows are sorted by category once at load, so each category is a
+    contiguous slice and a search only scores that slice's attribute
+    columns (no gather). Results are ranked by attribute matches against the
+    query (MATCH_WEIGHTS), then by catalog position, so they are
+    deterministic; only the returned rows are rendered as ProductMatch.
+    """
+
+    def __init__(self, columns: ProductColumns):
+        order = np.argsort(columns.category, kind="stable")
+        self.columns = ProductColumns(**{name: column[order] for name, column in vars(columns).items()})
+        # Original row numbers, so product ids don't depend on the sort
+        self.row_ids = order.astype(np.uint32)
+        self._bounds = np.searchsorted(self.columns.category, np.arange(len(CATEGORIES) + 1))
+
+    def __len__(self) -> int:
+        return len(self.row_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.columns.nbytes + self.row_ids.nbytes
+
+    def _category_slices(self, category: Optional[str]) -> list[slice]:
+        """Slices of the categories matching `category` (whole catalog if none do)."""
+        if category:
+            wanted = category.lower()
+            codes = [
+                i for i, name in enumerate(CATEGORY_NAMES)
+                if wanted in name or name in wanted
+            ]
+            if codes:
+                return [slice(self._bounds[i], self._bounds[i + 1]) for i in codes]
+        return [slice(0, len(self))]
+
+    def _score(self, rows: slice, mentioned: dict[str, list[int]]) -> np.ndarray:
+        score = np.zeros(rows.stop - rows.start, dtype=np.uint8)
+        for field, codes in mentioned.items():
+            if codes:
+                column = getattr(self.columns, field)[rows]
+                score += np.isin(column, codes).astype(np.uint8) * MATCH_WEIGHTS[field]
+        return score
+
+    @staticmethod
+    def _top(score: np.ndarray, limit: int) -> tuple[np.ndarray, np.ndarray]:
+        """(positions, scores) of the best `limit` entries, ties in position order."""
+        positions = []
+        for level in range(int(score.max(initial=0)), -1, -1):
+            hits = np.flatnonzero(score == level)
+            positions.append(hits[: limit - sum(len(p) for p in positions)])
+            if sum(len(p) for p in positions) >= limit:
+                break
+        top = np.concatenate(positions) if positions else np.empty(0, dtype=np.int64)
+        return top, score[top]
+
+    def search(self, query: str, category: Optional[str], limit: int) -> list[ProductMatch]:
+        """The `limit` best products for the query within the category."""
+        with metrics.track("catalog_search"):
+            mentioned = _mentioned(query)
+
+            candidates = []
+            for rows in self._category_slices(category):
+                positions, scores = self._top(self._score(rows, mentioned), limit)
+                candidates.extend(zip(scores.tolist(), (positions + rows.start).tolist()))
+            # Best score first, then catalog position
+            candidates.sort(key=lambda c: (-c[0], c[1]))
+
+            return [self._render(row, query) for _, row in candidates[:limit]]
+
+    def _render(self, row: int, query: str) -> ProductMatch:
+        c = self.columns
+        product_id = f"syn-{int(self.row_ids[row]):08d}"
+        name = (
+            f"{BRANDS[c.brand[row]]} {SERIES[c.series[row]]} {STYLES[c.style[row]].title()} "
+            f"{MATERIAL_NAMES[c.material[row]].title()} {CATEGORY_NAMES[c.category[row]].title()}"
+            f" - {COLORS[c.color[row]].title()}"
+        )
+        return ProductMatch(
+            id=product_id,
+            name=name,
+            price=round(float(c.price[row]), 2),
+            currency="USD",
+            imageUrl=f"https://via.placeholder.com/400?text={product_id}",
+            productUrl=f"https://example.com/catalog/{product_id}",
+            retailer=RETAILERS[c.retailer[row]],
+            similarity=calculate_similarity(query, name),
+        )
+
+
+def build_catalog_store(size: int, seed: int) -> CatalogStore:
+    """Generate a synthetic catalog and load it into a CatalogStore (CPU-bound, seconds at 10^7)."""
+    start = time.perf_counter()
+    store = CatalogStore(generate_catalog(size, seed))
+    logger.info(
+        "Synthetic catalog: %d products, %.1fMB, built in %.1fs",
+        len(store), store.nbytes / 1e6, time.perf_counter() - start,
+    )
+    metrics.set_gauge("catalog_products", len(store))
+    metrics.set_gauge("catalog_bytes", store.nbytes)
+    return store
+
+
+metrics.describe("catalog_products", "Products in the synthetic mock-mode catalog.")
+metrics.describe("catalog_bytes", "Memory held by the synthetic catalog's columns.")
@@ -0,0 +1,152 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from ..config import get_settings
+from .deadline import DeadlineExceededError, budget_timeout, remaining_budget
+from .metrics import metrics
+
+
+class OverloadedError(Exception):
+    """Raised when a limiter's wait queue is full or the wait timed out."""
+
+    def __init__(self, limiter: str, reason: str, retry_after: float):
+        super().__init__(f"{limiter} overloaded ({reason})")
+        self.limiter = limiter
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    Bounded concurrency with a bounded, time-limited wait queue.
+
+    Up to `max_concurrency` holders run at once; up to `max_queue` callers
+    wait for a slot for at most `queue_timeout` seconds. Anyone beyond that
+    is rejected immediately with OverloadedError, so a burst turns into fast
+    failures instead of a pile-up of slow timeouts. Inside a request deadline
+    the wait is also capped by the remaining budget (DeadlineExceededError).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        retry_after: float = 1.0,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    async def acquire(self):
+        """Take a slot, waiting in the bounded queue if necessary."""
+        remaining = remaining_budget()
+        if remaining is not None and remaining <= 0:
+            self._reject_deadline()
+        if self._semaphore.locked():
+            if self._waiting >= self.max_queue:
+                self._reject("queue_full")
+            timeout = budget_timeout(self.queue_timeout)
+            self._waiting += 1
+            self._publish()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+            except asyncio.TimeoutError:
+                if timeout < self.queue_timeout:
+                    self._reject_deadline()
+                self._reject("queue_timeout")
+            finally:
+                self._waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self._in_flight += 1
+        self._publish()
+
+    def release(self):
+        """Return a slot taken with acquire()."""
+        self._in_flight -= 1
+        self._semaphore.release()
+        self._publish()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _reject(self, reason: str):
+        metrics.inc("concurrency_rejected_total", limiter=self.name, reason=reason)
+        self._publish()
+        raise OverloadedError(self.name, reason, self.retry_after)
+
+    def _reject_deadline(self):
+        metrics.inc("concurrency_rejected_total", limiter=self.name, reason="deadline")
+        self._publish()
+        raise DeadlineExceededError(f"Request deadline passed waiting for {self.name}")
+
+    def _publish(self):
+        metrics.set_gauge("concurrency_in_flight", self._in_flight, limiter=self.name)
+        metrics.set_gauge("concurrency_queue_depth", self._waiting, limiter=self.name)
+
+
+def _build_upstream_limiters() -> dict[str, ConcurrencyLimiter]:
+    settings = get_settings()
+    limits = {
+        "gemini": settings.gemini_max_concurrency,
+        "cloud_vision": settings.cloud_vision_max_concurrency,
+        "serper": settings.serper_max_concurrency,
+        "image_download": settings.image_download_max_concurrency,
+    }
+    return {
+        name: ConcurrencyLimiter(
+            name,
+            max_concurrency=limit,
+            max_queue=settings.upstream_max_queue,
+            queue_timeout=settings.upstream_queue_timeout_seconds,
+        )
+        for name, limit in limits.items()
+    }
+
+
+def _build_admission_controller() -> ConcurrencyLimiter:
+    settings = get_settings()
+    return ConcurrencyLimiter(
+        "admission",
+        max_concurrency=settings.admission_max_in_flight,
+        max_queue=settings.admission_max_queue,
+        queue_timeout=settings.admission_queue_timeout_seconds,
+        retry_after=settings.admission_retry_after_seconds,
+    )
+
+
+# Singleton instances
+upstream_limiters = _build_upstream_limiters()
+admission_controller = _build_admission_controller()
+
+
+def upstream(name: str) -> ConcurrencyLimiter:
+    """Get the concurrency limiter for an upstream ("gemini", "serper", ...)."""
+    return upstream_limiters[name]
+
+
+metrics.describe("concurrency_in_flight", "Holders of a concurrency slot, by limiter.")
+metrics.describe("concurrency_queue_depth", "Callers waiting for a concurrency slot, by limiter.")
+metrics.describe("concurrency_rejected_total", "Requests rejected by a concurrency limiter, by reason.")
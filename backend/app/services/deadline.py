@@ -0,0 +1,80 @@
+import time
+import asyncio
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+from .metrics import metrics
+
+T = TypeVar("T")
+
+
+class Deadline:
+    """Absolute point in time by which a request's response is due."""
+
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (negative once it has passed)."""
+        return self.expires_at - time.monotonic()
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a budgeted call runs past the request deadline."""
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def start_deadline(seconds: float) -> Deadline:
+    """Set the deadline for the current request (visible to every task it spawns)."""
+    deadline = Deadline(seconds)
+    _current_deadline.set(deadline)
+    return deadline
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left for the current request, or None when no deadline is set."""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline.remaining()
+
+
+def has_budget(stage: str, needed: float) -> bool:
+    """
+    Whether an optional stage needing `needed` seconds still fits the budget.
+
+    Always True outside a request deadline. Skips are counted per stage.
+    """
+    remaining = remaining_budget()
+    if remaining is None or remaining >= needed:
+        return True
+    metrics.inc("deadline_skipped_total", stage=stage)
+    return False
+
+
+def budget_timeout(default: float) -> float:
+    """Cap a per-call timeout to the time left on the request deadline."""
+    remaining = remaining_budget()
+    if remaining is None:
+        return default
+    return max(0.0, min(default, remaining))
+
+
+async def within_budget(awaitable: Awaitable[T]) -> T:
+    """Await `awaitable`, cancelling it if the request deadline passes first."""
+    remaining = remaining_budget()
+    if remaining is None:
+        return await awaitable
+    if remaining <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceededError("Request deadline already passed")
+    try:
+        return await asyncio.wait_for(awaitable, timeout=remaining)
+    except asyncio.TimeoutError:
+        raise DeadlineExceededError("Request deadline exceeded") from None
+
+
+metrics.describe("deadline_skipped_total", "Optional stages skipped for lack of deadline budget, by stage.")
@@ -0,0 +1,125 @@
+import logging
+import time
+import asyncio
+from functools import lru_cache
+from typing import Any, Callable, Optional
+from ..config import get_settings
+from .metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+# How long to send instructions inline after a failed context-cache upload
+CACHE_RETRY_SECONDS = 600
+
+
+@lru_cache()
+def get_gemini_client():
+    """Shared Gemini client (keeps its HTTP connection pool across requests)."""
+    from google import genai
+
+    return genai.Client(api_key=get_settings().gemini_api_key)
+
+
+class GeminiTemplate:
+    """
+    A prebuilt Gemini request: static system instruction plus response schema.
+
+    The schema and instruction are built once (the builder runs on first use,
+    or at startup via warm_up) and the GenerateContentConfig is reused for
+    every call on the same model. When context caching is enabled, the static
+    instruction is uploaded once per model as cached content so requests only
+    carry the per-call parts; if the SDK or model rejects the cache (e.g. the
+    instruction is below the minimum cacheable size) we fall back to sending
+    it as a plain system instruction.
+    """
+
+    def __init__(self, name: str, builder: Callable[[], tuple[str, Any]]):
+        self.name = name
+        self._builder = builder
+        self._built: Optional[tuple[str, Any]] = None
+        self._configs: dict[str, Any] = {}
+        self._cached_contents: dict[str, tuple[str, float]] = {}
+        self._cache_retry_at: dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    @property
+    def system_instruction(self) -> str:
+        return self._build()[0]
+
+    @property
+    def response_schema(self):
+        return self._build()[1]
+
+    def _build(self) -> tuple[str, Any]:
+        if self._built is None:
+            self._built = self._builder()
+        return self._built
+
+    async def config_for(self, model: str):
+        """Return a reusable GenerateContentConfig for this template and model."""
+        settings = get_settings()
+        if settings.gemini_context_cache and self._cache_retry_at.get(model, 0.0) <= time.monotonic():
+            cached = self._cached_contents.get(model)
+            if cached is None or cached[1] <= time.monotonic():
+                async with self._lock:
+                    cached = self._cached_contents.get(model)
+                    if cached is None or cached[1] <= time.monotonic():
+                        await self._create_cached_content(model)
+            if model in self._cached_contents:
+                return self._configs[f"{model}:cached"]
+
+        config = self._configs.get(model)
+        if config is None:
+            from google.genai import types
+
+            config = self._configs[model] = types.GenerateContentConfig(
+                system_instruction=self.system_instruction,
+                response_mime_type="application/json",
+                response_schema=self.response_schema,
+            )
+        return config
+
+    async def _create_cached_content(self, model: str):
+        """Upload the static instruction as cached context for `model`."""
+        from google.genai import types
+
+        settings = get_settings()
+        ttl = settings.gemini_context_cache_ttl_seconds
+        try:
+            cache = await get_gemini_client().aio.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    display_name=f"roomradar-{self.name}",
+                    system_instruction=self.system_instruction,
+                    ttl=f"{ttl}s",
+                ),
+            )
+        except Exception as e:
+            logger.warning("Context cache unavailable for %s on %s, sending inline: %s", self.name, model, e)
+            self._cached_contents.pop(model, None)
+            self._configs.pop(f"{model}:cached", None)
+            # Don't retry on every request; the failure is usually a model/size limit
+            self._cache_retry_at[model] = time.monotonic() + CACHE_RETRY_SECONDS
+            metrics.inc("gemini_context_cache_total", template=self.name, result="unsupported")
+            return
+
+        # Refresh a minute before the server-side TTL runs out
+        expires_at = time.monotonic() + max(ttl - 60, ttl / 2)
+        self._cached_contents[model] = (cache.name, expires_at)
+        self._configs[f"{model}:cached"] = types.GenerateContentConfig(
+            cached_content=cache.name,
+            response_mime_type="application/json",
+            response_schema=self.response_schema,
+        )
+        metrics.inc("gemini_context_cache_total", template=self.name, result="created")
+
+    async def warm_up(self, models: list[str]):
+        """Build the template and, if enabled, upload cached context ahead of traffic."""
+        self._build()
+        for model in models:
+            await self.config_for(model)
+
+
+metrics.describe("gemini_context_cache_total", "Gemini cached-context uploads, by template and result.")
@@ -0,0 +1,122 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+from .. import imaging
+from ..config import get_settings
+from .metrics import metrics
+
+
+class ImageProcessor:
+    """
+    Runs Pillow decode/crop/resize/encode work off the event loop.
+
+    With image_process_workers > 0, operations run in a process pool so they
+    scale across cores without holding the GIL. Image bytes are handed to the
+    worker through a shared memory block rather than pickled through the pool's
+    pipe; only the (small) re-encoded result comes back pickled. With 0 workers,
+    or if shared memory can't be allocated, work falls back to a thread.
+    """
+
+    def __init__(self, workers: int):
+        self._workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self._workers <= 0:
+            return None
+        if self._pool is None:
+            # forkserver avoids forking a process that already runs threads
+            context = multiprocessing.get_context("forkserver")
+            self._pool = ProcessPoolExecutor(max_workers=self._workers, mp_context=context)
+        return self._pool
+
+    async def crop(self, image_bytes: bytes, box: dict, padding: float = 0.05) -> bytes:
+        """Crop a normalized bounding box ({x, y, width, height}) and encode as JPEG."""
+        normalized = (
+            box.get("x", 0),
+            box.get("y", 0),
+            box.get("width", 1),
+            box.get("height", 1),
+        )
+        return await self._run("crop", image_bytes, (normalized, padding))
+
+    async def thumbnail(self, image_bytes: bytes, max_size: int = 512, quality: int = 85) -> bytes:
+        """Downscale to fit max_size x max_size and encode as JPEG."""
+        return await self._run("thumbnail", image_bytes, (max_size, quality))
+
+    async def crops(
+        self,
+        image_bytes: bytes,
+        boxes: list[dict],
+        padding: float = 0.0,
+        max_size: Optional[int] = None,
+    ) -> list[bytes]:
+        """Cut several normalized boxes ({x, y, width, height}) out of one decode."""
+        normalized = [(b["x"], b["y"], b["width"], b["height"]) for b in boxes]
+        return await self._run("crops", image_bytes, (normalized, padding, max_size))
+
+    async def dhash(self, image_bytes: bytes, hash_size: int = 8) -> int:
+        """Perceptual difference hash (hash_size**2 bits) of an image."""
+        return await self._run("dhash", image_bytes, (hash_size,))
+
+    async def _run(self, op: str, image_bytes: bytes, args: tuple):
+        with metrics.track("image_process", op=op):
+            pool = self._get_pool()
+            if pool is None:
+                return await asyncio.to_thread(imaging.run_operation, op, image_bytes, args)
+            try:
+                return await self._run_in_pool(pool, op, image_bytes, args)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM on a huge image); start a fresh pool next time
+                self._pool = None
+                raise
+
+    async def _run_in_pool(
+        self, pool: ProcessPoolExecutor, op: str, image_bytes: bytes, args: tuple
+    ):
+        loop = asyncio.get_running_loop()
+        try:
+            shm = SharedMemory(create=True, size=max(1, len(image_bytes)))
+        except OSError:
+            # /dev/shm is small in some containers; pickling still keeps the loop free
+            metrics.inc("image_process_shm_fallback_total")
+            return await loop.run_in_executor(
+                pool, imaging.run_operation, op, image_bytes, args
+            )
+
+        try:
+            shm.buf[: len(image_bytes)] = image_bytes
+            return await loop.run_in_executor(
+                pool, imaging.run_operation_shared, op, shm.name, len(image_bytes), args
+            )
+        finally:
+            shm.close()
+            shm.unlink()
+
+    async def warm_up(self):
+        """Start the worker processes so the first request doesn't pay for it."""
+        pool = self._get_pool()
+        if pool is None:
+            return
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *[loop.run_in_executor(pool, imaging.ping) for _ in range(self._workers)]
+        )
+
+    def shutdown(self):
+        """Stop worker processes (called on app shutdown)."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Singleton instance
+image_processor = ImageProcessor(workers=get_settings().image_process_workers)
+
+metrics.describe(
+    "image_process_shm_fallback_total",
+    "Image operations that pickled bytes because shared memory was unavailable.",
+)
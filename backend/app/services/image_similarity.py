@@ -1,9 +1,64 @@
-import io
+import logging
 import json
 import asyncio
 from typing import Optional
-from PIL import Image as PILImage
 from ..config import get_settings
+from .metrics import metrics
+from .gemini import GeminiTemplate, get_gemini_client
+from .concurrency import upstream
+from .deadline import budget_timeout, has_budget, within_budget
+from .image_processing import image_processor
+
+
+logger = logging.getLogger(__name__)
+
+
+# Content types Pillow can decode; some CDNs serve images as octet-stream
+ALLOWED_PRODUCT_IMAGE_TYPES = {
+    "image/jpeg",
+    "image/jpg",
+    "image/png",
+    "image/webp",
+    "image/gif",
+    "application/octet-stream",
+}
+
+VISUAL_SCORE_INSTRUCTIONS = (
+    "The FIRST image you are given is the REFERENCE furniture item from a user's photo. "
+    "The following images are product listings, each followed by its product number and name. "
+    "Rate how visually similar each product is to the reference on a scale of 0.0 to 1.0.\n"
+    "Consider: shape/silhouette, color, material, style, proportions, and overall appearance.\n"
+    "0.0 = completely different, 0.5 = somewhat similar, 0.8+ = very similar, 1.0 = near identical.\n\n"
+    "Return a JSON object with a 'scores' array. "
+    "Each entry should have 'product_number' (1-indexed) and 'score' (0.0-1.0)."
+)
+
+
+def _build_visual_score_template():
+    """Build the visual scoring instructions and response schema."""
+    from google.genai import types
+
+    score_item = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "product_number": types.Schema(type=types.Type.INTEGER, description="Product number (1-indexed)"),
+            "score": types.Schema(type=types.Type.NUMBER, description="Visual similarity score 0.0-1.0"),
+        },
+        required=["product_number", "score"],
+    )
+
+    response_schema = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "scores": types.Schema(type=types.Type.ARRAY, items=score_item),
+        },
+        required=["scores"],
+    )
+    return VISUAL_SCORE_INSTRUCTIONS, response_schema
+
+
+# Built once and reused for every request (see GeminiTemplate)
+VISUAL_SCORE_TEMPLATE = GeminiTemplate("visual_score", _build_visual_score_template)
 
 
 class ImageSimilarityService:
@@ -12,45 +67,80 @@ class ImageSimilarityService:
     def __init__(self):
         self.settings = get_settings()
 
-    def crop_furniture(self, image_bytes: bytes, bounding_box: dict, padding: float = 0.05) -> bytes:
-        """Crop a furniture item from the full image using bounding box coordinates."""
-        img = PILImage.open(io.BytesIO(image_bytes))
-        w, h = img.size
+    async def warm_up(self):
+        """Prebuild the visual scoring template (and cached context) before serving traffic."""
+        if not self.settings.gemini_api_key:
+            return
+        await VISUAL_SCORE_TEMPLATE.warm_up([self.settings.gemini_model])
 
-        x = bounding_box.get("x", 0)
-        y = bounding_box.get("y", 0)
-        bw = bounding_box.get("width", 1)
-        bh = bounding_box.get("height", 1)
-
-        left = max(0, int((x - padding) * w))
-        top = max(0, int((y - padding) * h))
-        right = min(w, int((x + bw + padding) * w))
-        bottom = min(h, int((y + bh + padding) * h))
-
-        cropped = img.crop((left, top, right, bottom))
-        buf = io.BytesIO()
-        cropped.save(buf, format="JPEG", quality=90)
-        return buf.getvalue()
+    async def crop_furniture(self, image_bytes: bytes, bounding_box: dict, padding: float = 0.05) -> bytes:
+        """Crop a furniture item from the full image using bounding box coordinates (off the event loop)."""
+        crops = await image_processor.crops(
+            image_bytes, [bounding_box], padding, max_size=self.settings.reference_crop_max_size
+        )
+        return crops[0]
+
+    async def reference_crops(self, image_bytes: bytes, detections: list, padding: float = 0.05) -> dict[str, bytes]:
+        """Reference crops for every detection (one decode), keyed by detection id."""
+        crops = await image_processor.crops(
+            image_bytes,
+            [d.boundingBox.model_dump() for d in detections],
+            padding,
+            max_size=self.settings.reference_crop_max_size,
+        )
+        return {d.id: crop for d, crop in zip(detections, crops)}
 
     async def download_product_images(self, urls: list[str], max_size: int = 512) -> list[Optional[bytes]]:
         """Download and resize product images in parallel. Returns None for failed downloads."""
         import httpx
 
-        async def download_one(url: str) -> Optional[bytes]:
+        async def download_one(client: "httpx.AsyncClient", url: str) -> Optional[bytes]:
             try:
-                async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-                    response = await client.get(url)
-                    response.raise_for_status()
-                    img = PILImage.open(io.BytesIO(response.content))
-                    img.thumbnail((max_size, max_size))
-                    buf = io.BytesIO()
-                    img.save(buf, format="JPEG", quality=85)
-                    return buf.getvalue()
+                with metrics.track("image_download"):
+                    async with upstream("image_download").slot():
+                        body = await self._fetch_image_bytes(client, url)
+                    return await image_processor.thumbnail(body, max_size, quality=85)
             except Exception as e:
-                print(f"Failed to download product image {url}: {e}")
+                logger.warning("Failed to download product image %s: %s", url, e)
                 return None
 
-        return await asyncio.gather(*[download_one(url) for url in urls])
+        if not has_budget("image_download", 0.0):
+            return [None] * len(urls)
+        with metrics.track("image_download_batch", timing="download"):
+            # One client per batch so downloads from the same CDN share connections
+            async with httpx.AsyncClient(timeout=budget_timeout(10.0), follow_redirects=True) as client:
+                return await asyncio.gather(*[download_one(client, url) for url in urls])
+
+    async def _fetch_image_bytes(self, client, url: str) -> bytes:
+        """
+        Stream an image body with a hard byte cap.
+
+        Rejects non-image content types and bodies whose declared or actual
+        size exceeds max_product_image_bytes, without buffering past the cap.
+        """
+        max_bytes = self.settings.max_product_image_bytes
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+
+            content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+            if content_type not in ALLOWED_PRODUCT_IMAGE_TYPES:
+                metrics.inc("image_download_rejected_total", reason="content_type")
+                raise ValueError(f"Unsupported content type {content_type or 'unknown'}")
+
+            declared = response.headers.get("content-length")
+            if declared and declared.isdigit() and int(declared) > max_bytes:
+                metrics.inc("image_download_rejected_total", reason="content_length")
+                raise ValueError(f"Image too large ({declared} bytes)")
+
+            chunks = []
+            received = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > max_bytes:
+                    metrics.inc("image_download_rejected_total", reason="streamed_size")
+                    raise ValueError(f"Image larger than {max_bytes} bytes")
+                chunks.append(chunk)
+        return b"".join(chunks)
 
     async def score_visual_similarity(
         self,
@@ -61,68 +151,82 @@ class ImageSimilarityService:
         """
         Score visual similarity between reference and product images using Gemini.
 
-        Sends all images in a single request for efficiency.
+        Products are scored in chunks of visual_score_chunk_size, each its own
+        request carrying the reference image, all running concurrently. A chunk
+        that fails or misses its timeout only loses its own scores.
         Returns {product_index: similarity_score} for successfully scored products.
         """
-        from google import genai
-        from google.genai import types
-
         # Filter to only products with downloaded images
         valid_indices = [i for i, img in enumerate(product_images) if img is not None]
         if not valid_indices:
+            metrics.inc("visual_score_skipped_total", reason="no_images")
+            return {}
+
+        size = max(1, self.settings.visual_score_chunk_size)
+        chunks = [valid_indices[i:i + size] for i in range(0, len(valid_indices), size)]
+
+        with metrics.track("visual_score", timing="visual_score"):
+            results = await asyncio.gather(*[
+                self._score_chunk(reference_image, product_images, product_names, chunk)
+                for chunk in chunks
+            ])
+
+        scores: dict[int, float] = {}
+        for chunk_scores in results:
+            scores.update(chunk_scores)
+        return scores
+
+    async def _score_chunk(
+        self,
+        reference_image: bytes,
+        product_images: list[Optional[bytes]],
+        product_names: list[str],
+        indices: list[int],
+    ) -> dict[int, float]:
+        """Score one chunk within its timeout; failures yield no scores."""
+        timeout = budget_timeout(self.settings.visual_score_chunk_timeout_seconds)
+        try:
+            scores = await asyncio.wait_for(
+                self._score_with_gemini(reference_image, product_images, product_names, indices),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            metrics.inc("visual_score_chunks_total", outcome="timeout")
+            return {}
+        except Exception as e:
+            logger.warning("Visual scoring chunk failed: %s", e)
+            metrics.inc("visual_score_chunks_total", outcome="error")
             return {}
+        metrics.inc("visual_score_chunks_total", outcome="success")
+        return scores
 
-        client = genai.Client(api_key=self.settings.gemini_api_key)
+    async def _score_with_gemini(
+        self,
+        reference_image: bytes,
+        product_images: list[Optional[bytes]],
+        product_names: list[str],
+        valid_indices: list[int],
+    ) -> dict[int, float]:
+        """Send the reference and downloadable product images to Gemini for scoring."""
+        from google.genai import types
 
-        # Build content parts: reference image + all product images
+        # Static scoring instructions live in the template; only images and names vary
         parts = [
             types.Part.from_bytes(data=reference_image, mime_type="image/jpeg"),
-            types.Part.from_text(
-                "The FIRST image above is the REFERENCE furniture item from a user's photo. "
-                "The following images are product listings. "
-                "Rate how visually similar each product is to the reference on a scale of 0.0 to 1.0.\n"
-                "Consider: shape/silhouette, color, material, style, proportions, and overall appearance.\n"
-                "0.0 = completely different, 0.5 = somewhat similar, 0.8+ = very similar, 1.0 = near identical.\n\n"
-                "Products to score:\n"
-            ),
+            types.Part.from_text(text="REFERENCE"),
         ]
 
         for idx, i in enumerate(valid_indices):
             parts.append(types.Part.from_bytes(data=product_images[i], mime_type="image/jpeg"))
-            parts.append(types.Part.from_text(f"Product {idx + 1}: {product_names[i]}"))
-
-        # Schema for structured response
-        score_item = types.Schema(
-            type=types.Type.OBJECT,
-            properties={
-                "product_number": types.Schema(type=types.Type.INTEGER, description="Product number (1-indexed)"),
-                "score": types.Schema(type=types.Type.NUMBER, description="Visual similarity score 0.0-1.0"),
-            },
-            required=["product_number", "score"],
-        )
-
-        response_schema = types.Schema(
-            type=types.Type.OBJECT,
-            properties={
-                "scores": types.Schema(type=types.Type.ARRAY, items=score_item),
-            },
-            required=["scores"],
-        )
-
-        parts.append(types.Part.from_text(
-            "\nReturn a JSON object with a 'scores' array. "
-            "Each entry should have 'product_number' (1-indexed) and 'score' (0.0-1.0)."
-        ))
+            parts.append(types.Part.from_text(text=f"Product {idx + 1}: {product_names[i]}"))
 
         model_name = self.settings.gemini_model  # Use flash for speed
-        response = client.models.generate_content(
-            model=model_name,
-            contents=parts,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                response_schema=response_schema,
-            ),
-        )
+        async with upstream("gemini").slot():
+            response = await within_budget(get_gemini_client().aio.models.generate_content(
+                model=model_name,
+                contents=parts,
+                config=await VISUAL_SCORE_TEMPLATE.config_for(model_name),
+            ))
 
         result = json.loads(response.text)
         scores = {}
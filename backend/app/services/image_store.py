@@ -1,53 +1,184 @@
+import logging
 import uuid
 import time
+import hashlib
 import threading
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+from ..config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def hash_image(image_bytes: bytes) -> str:
+    """Content hash used to recognise an image the server already holds."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+@dataclass
+class ImageSession:
+    """
+    A stored upload plus what we already know about it.
+
+    `crops` holds a reference crop per detection id, so visual matching
+    doesn't need the original; `image_bytes` is dropped (set to None) once
+    the crops are in and the original has outlived its shorter TTL.
+    """
+
+    image_bytes: Optional[bytes]
+    stored_at: float
+    image_hash: str
+    detections: Optional[list[Any]] = None
+    crops: dict[str, bytes] = field(default_factory=dict)
 
 
 class ImageStore:
-    """Thread-safe in-memory image store with TTL for visual similarity matching."""
+    """
+    Thread-safe in-memory image store with TTL for visual similarity matching.
+
+    Sessions live for `ttl_seconds`; the full-resolution original only for
+    `original_ttl_seconds` once per-detection crops have been stored.
+    """
 
-    def __init__(self, ttl_seconds: int = 600, max_entries: int = 100):
-        self._store: dict[str, tuple[bytes, float]] = {}
+    def __init__(self, ttl_seconds: int = 600, max_entries: int = 100, original_ttl_seconds: int = 600):
+        self._store: dict[str, ImageSession] = {}
+        self._by_hash: dict[str, str] = {}
         self._lock = threading.Lock()
         self._ttl = ttl_seconds
+        self._original_ttl = original_ttl_seconds
         self._max_entries = max_entries
+        self._expiry_listeners: list[Callable[[str], None]] = []
 
         # Start background cleanup thread
         self._cleanup_thread = threading.Thread(target=self._cleanup_loop, daemon=True)
         self._cleanup_thread.start()
 
-    def store(self, image_bytes: bytes) -> Optional[str]:
-        """Store an image and return a session ID. Returns None if store is full."""
+    def store(self, image_bytes: bytes, image_hash: Optional[str] = None) -> Optional[str]:
+        """
+        Store an image and return a session ID. Returns None if store is full.
+
+        Storing bytes that are already held returns the existing session ID
+        (and refreshes its TTL) instead of keeping a second copy.
+        """
+        if image_hash is None:
+            image_hash = hash_image(image_bytes)
+
         with self._lock:
             # Evict expired entries first
             self._evict_expired()
 
+            existing = self._by_hash.get(image_hash)
+            if existing is not None:
+                session = self._store[existing]
+                session.stored_at = time.time()
+                if session.image_bytes is None:
+                    session.image_bytes = image_bytes
+                return existing
+
             if len(self._store) >= self._max_entries:
                 return None
 
             session_id = str(uuid.uuid4())
-            self._store[session_id] = (image_bytes, time.time())
+            self._store[session_id] = ImageSession(
+                image_bytes=image_bytes, stored_at=time.time(), image_hash=image_hash
+            )
+            self._by_hash[image_hash] = session_id
             return session_id
 
     def get(self, session_id: str) -> Optional[bytes]:
         """Retrieve an image by session ID. Returns None if not found or expired."""
+        session = self.get_session(session_id)
+        return session.image_bytes if session else None
+
+    def get_session(self, session_id: str) -> Optional[ImageSession]:
+        """Retrieve a session by ID. Returns None if not found or expired."""
+        with self._lock:
+            return self._live_session(session_id)
+
+    def find_by_hash(self, image_hash: str) -> Optional[tuple[str, ImageSession]]:
+        """Look up a live session by image content hash, refreshing its TTL on a hit."""
         with self._lock:
-            entry = self._store.get(session_id)
-            if entry is None:
+            session_id = self._by_hash.get(image_hash)
+            if session_id is None:
                 return None
-            image_bytes, stored_at = entry
-            if time.time() - stored_at > self._ttl:
-                del self._store[session_id]
+            session = self._live_session(session_id)
+            if session is None:
                 return None
-            return image_bytes
+            session.stored_at = time.time()
+            return session_id, session
+
+    def set_detections(self, session_id: str, detections: list[Any]):
+        """Cache detection results alongside a stored image."""
+        with self._lock:
+            session = self._store.get(session_id)
+            if session is not None:
+                session.detections = detections
+
+    def set_crops(self, session_id: str, crops: dict[str, bytes]):
+        """Store reference crops keyed by detection id."""
+        with self._lock:
+            session = self._store.get(session_id)
+            if session is not None:
+                session.crops = crops
+
+    def get_crop(self, session_id: str, detection_id: str) -> Optional[bytes]:
+        """A detection's reference crop. Returns None if not found or expired."""
+        with self._lock:
+            session = self._live_session(session_id)
+            return session.crops.get(detection_id) if session else None
+
+    def add_expiry_listener(self, callback: Callable[[str], None]):
+        """
+        Call `callback(session_id)` whenever a session expires.
+
+        Callbacks run with the store lock held, possibly on the cleanup
+        thread, so they must be quick and thread-safe.
+        """
+        self._expiry_listeners.append(callback)
+
+    def _live_session(self, session_id: str) -> Optional[ImageSession]:
+        """Return a session if present and unexpired. Must be called with lock held."""
+        session = self._store.get(session_id)
+        if session is None:
+            return None
+        age = time.time() - session.stored_at
+        if age > self._ttl:
+            self._remove(session_id)
+            return None
+        if age > self._original_ttl:
+            self._drop_original(session)
+        return session
+
+    def _drop_original(self, session: ImageSession):
+        """Free the full-size upload once crops cover every detection. Lock held."""
+        if session.image_bytes is None or session.detections is None:
+            return
+        if all(d.id in session.crops for d in session.detections):
+            session.image_bytes = None
+
+    def _remove(self, session_id: str):
+        """Drop a session and its hash index entry. Must be called with lock held."""
+        session = self._store.pop(session_id, None)
+        if session is None:
+            return
+        if self._by_hash.get(session.image_hash) == session_id:
+            del self._by_hash[session.image_hash]
+        for callback in self._expiry_listeners:
+            try:
+                callback(session_id)
+            except Exception as e:
+                logger.exception("Image store expiry listener failed: %s", e)
 
     def _evict_expired(self):
         """Remove expired entries. Must be called with lock held."""
         now = time.time()
-        expired = [k for k, (_, t) in self._store.items() if now - t > self._ttl]
+        expired = [k for k, s in self._store.items() if now - s.stored_at > self._ttl]
         for key in expired:
-            del self._store[key]
+            self._remove(key)
+        for session in self._store.values():
+            if now - session.stored_at > self._original_ttl:
+                self._drop_original(session)
 
     def _cleanup_loop(self):
         """Periodically clean up expired entries."""
@@ -57,5 +188,14 @@ class ImageStore:
                 self._evict_expired()
 
 
+def _build_image_store() -> ImageStore:
+    settings = get_settings()
+    return ImageStore(
+        ttl_seconds=settings.image_session_ttl_seconds,
+        max_entries=settings.image_session_max_entries,
+        original_ttl_seconds=settings.image_original_ttl_seconds,
+    )
+
+
 # Singleton instance
-image_store = ImageStore()
+image_store = _build_image_store()
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from typing import Optional
+from ..config import get_settings
+from .concurrency import ConcurrencyLimiter, admission_controller, upstream_limiters
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Degradation levels: each one also applies everything below it
+NORMAL = 0
+SKIP_REFINE = 1  # no crop-and-reanalyze second pass on /api/detect
+SKIP_VISUAL_SCORE = 2  # no visual re-ranking on POST /api/products/match
+STALE_SEARCH_ONLY = 3  # product searches served from caches only, stale entries included
+
+LEVEL_NAMES = {
+    NORMAL: "normal",
+    SKIP_REFINE: "skip_refine",
+    SKIP_VISUAL_SCORE: "skip_visual_score",
+    STALE_SEARCH_ONLY: "stale_search_only",
+}
+
+
+def _signal_level(value: float, thresholds: list[float], scale: float = 1.0) -> int:
+    """How many of the (ascending) thresholds, scaled, the value has reached."""
+    return sum(value >= threshold * scale for threshold in thresholds)
+
+
+class LoadController:
+    """
+    Switches optional pipeline work off in steps as the server saturates.
+
+    Every `interval` seconds it samples three signals: event-loop lag (how
+    late a timer fires), admission pressure ((in flight + queued) / slots)
+    and the fullest upstream wait queue (depth / max queue). Each signal has
+    one threshold per level; the target level is the highest any signal
+    reaches. Escalation is immediate. Recovery is one level at a time, and
+    only after every signal has stayed below `recovery_ratio` of the current
+    level's thresholds for `recovery_seconds`, so the mode doesn't flap.
+    """
+
+    def __init__(
+        self,
+        admission: ConcurrencyLimiter,
+        upstreams: dict[str, ConcurrencyLimiter],
+        interval: float,
+        lag_thresholds: list[float],
+        admission_thresholds: list[float],
+        upstream_thresholds: list[float],
+        recovery_ratio: float,
+        recovery_seconds: float,
+        enabled: bool = True,
+    ):
+        self.admission = admission
+        self.upstreams = upstreams
+        self.interval = interval
+        self.lag_thresholds = lag_thresholds
+        self.admission_thresholds = admission_thresholds
+        self.upstream_thresholds = upstream_thresholds
+        self.recovery_ratio = recovery_ratio
+        self.recovery_seconds = recovery_seconds
+        self.enabled = enabled
+
+        self.level = NORMAL
+        self.loop_lag = 0.0
+        self._calm_since: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        metrics.set_gauge("load_level", self.level)
+
+    def sheds(self, level: int, feature: str) -> bool:
+        """Whether work that is dropped at `level` should be skipped now (counted per feature)."""
+        if self.level < level:
+            return False
+        metrics.inc("load_shed_total", feature=feature)
+        return True
+
+    def start(self):
+        """Begin sampling (called at startup)."""
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop sampling (called at shutdown)."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            # Smoothed, but a single long stall still registers
+            self.loop_lag = max(lag, 0.5 * self.loop_lag + 0.5 * lag)
+            self.update(loop.time())
+
+    def _signals(self) -> tuple[float, float, float]:
+        admission = (self.admission.in_flight + self.admission.queue_depth) / self.admission.max_concurrency
+        upstream = max(
+            (limiter.queue_depth / limiter.max_queue for limiter in self.upstreams.values() if limiter.max_queue),
+            default=0.0,
+        )
+        return self.loop_lag, admission, upstream
+
+    def _target_level(self, scale: float = 1.0) -> int:
+        lag, admission, upstream = self._signals()
+        return max(
+            _signal_level(lag, self.lag_thresholds, scale),
+            _signal_level(admission, self.admission_thresholds, scale),
+            _signal_level(upstream, self.upstream_thresholds, scale),
+        )
+
+    def update(self, now: float):
+        """Re-evaluate the level from the current signals."""
+        lag, admission, upstream = self._signals()
+        metrics.set_gauge("event_loop_lag_seconds", lag)
+        metrics.set_gauge("load_admission_pressure", admission)
+        metrics.set_gauge("load_upstream_pressure", upstream)
+
+        target = self._target_level()
+        if target > self.level:
+            self._calm_since = None
+            self._set_level(target)
+            return
+
+        if self.level == NORMAL or self._target_level(self.recovery_ratio) >= self.level:
+            self._calm_since = None
+            return
+        if self._calm_since is None:
+            self._calm_since = now
+        elif now - self._calm_since >= self.recovery_seconds:
+            self._calm_since = now
+            self._set_level(self.level - 1)
+
+    def _set_level(self, level: int):
+        previous, self.level = self.level, level
+        metrics.set_gauge("load_level", level)
+        metrics.inc("load_level_transitions_total", from_level=LEVEL_NAMES[previous], to_level=LEVEL_NAMES[level])
+        lag, admission, upstream = self._signals()
+        log = logger.warning if level > previous else logger.info
+        log(
+            "Load level %s -> %s (loop lag %.3fs, admission %.2f, upstream queue %.2f)",
+            LEVEL_NAMES[previous], LEVEL_NAMES[level], lag, admission, upstream,
+        )
+
+
+def _build_load_controller() -> LoadController:
+    settings = get_settings()
+    return LoadController(
+        admission_controller,
+        upstream_limiters,
+        interval=settings.load_sample_interval_seconds,
+        lag_thresholds=settings.load_loop_lag_thresholds,
+        admission_thresholds=settings.load_admission_thresholds,
+        upstream_thresholds=settings.load_upstream_queue_thresholds,
+        recovery_ratio=settings.load_recovery_ratio,
+        recovery_seconds=settings.load_recovery_seconds,
+        enabled=settings.load_shedding,
+    )
+
+
+# Singleton instance
+load_controller = _build_load_controller()
+
+metrics.describe("load_level", "Current degradation level (0 normal, 1 skip refine, 2 skip visual score, 3 stale search only).")
+metrics.describe("load_level_transitions_total", "Degradation level changes, by from_level and to_level.")
+metrics.describe("load_shed_total", "Optional work skipped by the load controller, by feature.")
+metrics.describe("event_loop_lag_seconds", "Smoothed event-loop lag measured by the load controller.")
+metrics.describe("load_admission_pressure", "(In-flight + queued) admissions divided by admission slots.")
+metrics.describe("load_upstream_pressure", "Fullest upstream wait queue, as a fraction of its capacity.")
@@ -0,0 +1,165 @@
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from .metrics import metrics
+
+
+# Set per request by RequestIdMiddleware; inherited by the tasks it spawns
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed via extra= and is emitted as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, request_id, extra fields."""
+
+    converter = time.gmtime
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the current request id (runs in the logging caller's context)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class ErrorSamplingFilter(logging.Filter):
+    """
+    Rate-limit repeated warnings and errors.
+
+    Records at WARNING or above are keyed by logger and message template (not
+    the formatted message, so "failed for X" and "failed for Y" are one key).
+    Each key passes `burst` records per `window_seconds`; the rest are
+    dropped and counted, and the first record of the next window carries
+    the count as `suppressed`. Called from any thread, hence the lock.
+    """
+
+    def __init__(self, window_seconds: float, burst: int):
+        super().__init__()
+        self.window = window_seconds
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._windows: dict[tuple, list] = {}  # key -> [window start, emitted, suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state is not None else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                if len(self._windows) > 10_000:
+                    self._expire(now)
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+        metrics.inc("log_records_sampled_total", level=record.levelname)
+        return False
+
+    def _expire(self, now: float):
+        for key in [k for k, state in self._windows.items() if now - state[0] >= self.window]:
+            del self._windows[key]
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without formatting them.
+
+    Only the message is rendered here (args may be mutated after the call);
+    JSON encoding, traceback formatting and the stdout write happen on the
+    listener thread. When the queue is full, records are dropped rather
+    than blocking the caller.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("log_records_dropped_total")
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(level: str, json_format: bool, queue_size: int, sample_window_seconds: float, sample_burst: int):
+    """
+    Route the root logger (and uvicorn's) through a bounded queue to a stdout
+    writer thread. Safe to call again; the previous pipeline is replaced.
+    """
+    global _listener
+    stop_logging()
+
+    output = logging.StreamHandler(sys.stdout)
+    if json_format:
+        output.setFormatter(JSONFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    records: queue.Queue = queue.Queue(maxsize=queue_size)
+    handler = NonBlockingQueueHandler(records)
+    handler.addFilter(RequestContextFilter())
+    handler.addFilter(ErrorSamplingFilter(sample_window_seconds, sample_burst))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    # uvicorn installs its own stream handlers; send its records (access logs included) through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    # httpx logs every request at INFO (each product image, each Serper call)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread (called at shutdown)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+metrics.describe("log_records_sampled_total", "Repeated warning/error log records dropped by sampling, by level.")
+metrics.describe("log_records_dropped_total", "Log records dropped because the logging queue was full.")
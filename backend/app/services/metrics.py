@@ -0,0 +1,184 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from .timing import record_stage
+
+
+# Latency buckets (seconds) tuned for upstream API calls and image work
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_PREFIX = "roomradar_"
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, bucket_count: int):
+        self.counts = [0] * (bucket_count + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+
+class MetricsRegistry:
+    """
+    Thread-safe in-process metrics registry with Prometheus text rendering.
+
+    Counters, gauges and histograms are keyed by name and label set. Recording
+    is a dict lookup plus an increment under a lock, so it is cheap enough to
+    call on every request from both the event loop and executor threads.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        self._counters: dict[str, dict[LabelKey, float]] = {}
+        self._gauges: dict[str, dict[LabelKey, float]] = {}
+        self._histograms: dict[str, dict[LabelKey, _Histogram]] = {}
+        self._help: dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        """Register HELP text for a metric."""
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        """Increment a counter."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Set a gauge to an absolute value."""
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record an observation in a histogram."""
+        key = _label_key(labels)
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = _Histogram(len(self._buckets))
+            hist.counts[index] += 1
+            hist.total += value
+            hist.count += 1
+
+    @contextmanager
+    def track(
+        self,
+        stage: str,
+        timing: Optional[str] = None,
+        timing_desc: Optional[str] = None,
+        **labels,
+    ) -> Iterator[None]:
+        """
+        Time a pipeline stage.
+
+        Records the duration in `stage_duration_seconds` and increments
+        `stage_total` with outcome="success" or outcome="failure" depending
+        on whether the block raised. When `timing` is given, the duration is
+        also added to the active request's Server-Timing breakdown.
+        """
+        start = time.perf_counter()
+        outcome = "success"
+        try:
+            yield
+        except BaseException:
+            outcome = "failure"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe("stage_duration_seconds", elapsed, stage=stage, **labels)
+            self.inc("stage_total", stage=stage, outcome=outcome, **labels)
+            if timing:
+                record_stage(timing, elapsed, timing_desc)
+
+    def get_counter(self, name: str, **labels) -> float:
+        """Read the current value of a counter (0 if never incremented)."""
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines: list[str] = []
+        with self._lock:
+            for name in sorted(self._counters):
+                full = METRIC_PREFIX + name
+                self._render_header(lines, name, full, "counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{full}{_format_labels(key)} {_format_value(value)}")
+
+            for name in sorted(self._gauges):
+                full = METRIC_PREFIX + name
+                self._render_header(lines, name, full, "gauge")
+                for key, value in sorted(self._gauges[name].items()):
+                    lines.append(f"{full}{_format_labels(key)} {_format_value(value)}")
+
+            for name in sorted(self._histograms):
+                full = METRIC_PREFIX + name
+                self._render_header(lines, name, full, "histogram")
+                for key, hist in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(self._buckets + (float("inf"),), hist.counts):
+                        cumulative += count
+                        le = (("le", _format_value(bound)),)
+                        lines.append(f"{full}_bucket{_format_labels(key, le)} {cumulative}")
+                    lines.append(f"{full}_sum{_format_labels(key)} {_format_value(hist.total)}")
+                    lines.append(f"{full}_count{_format_labels(key)} {hist.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def _render_header(self, lines: list[str], name: str, full: str, metric_type: str):
+        help_text = self._help.get(name)
+        if help_text:
+            lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} {metric_type}")
+
+
+# Singleton instance
+metrics = MetricsRegistry()
+
+metrics.describe("stage_duration_seconds", "Duration of pipeline stages in seconds.")
+metrics.describe("stage_total", "Pipeline stage executions by outcome.")
+metrics.describe("detection_fallback_total", "Detection fallbacks taken, by target detector.")
+metrics.describe("image_store_lookups_total", "Reference lookups for visual matching, by result (crop/original/miss).")
+metrics.describe("image_lookup_total", "Upload-once image hash lookups, by endpoint and result.")
+metrics.describe("search_fallback_total", "Searches that fell back to Google Shopping, by kind.")
+metrics.describe("search_fallback_short_total", "Fallback searches that still returned fewer than limit unique results, by kind.")
+metrics.describe("prefetch_total", "Speculative match prefetches, by event (started/joined/join_queued/join_timeout/dropped/cancelled).")
+metrics.describe("prefetch_in_flight", "Speculative match prefetches running or queued.")
+metrics.describe("gemini_route_total", "Gemini calls by stage, model route (flash/pro) and routing reason.")
+metrics.describe("tiled_detection_total", "First-pass detections that ran on image tiles.")
+metrics.describe("image_download_rejected_total", "Product image downloads rejected before decoding, by reason.")
+metrics.describe("visual_score_chunks_total", "Visual scoring chunks, by outcome (success/timeout/error).")
+metrics.describe("visual_score_skipped_total", "Visual scoring requests skipped, by reason.")
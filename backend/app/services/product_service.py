@@ -1,12 +1,26 @@
+import logging
+import os
+import json
+import math
 import asyncio
 import random
 import hashlib
-from typing import Optional
+import threading
+import contextvars
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Optional
 from ..models.product import ProductMatch
 from ..data.mock_products import MOCK_PRODUCTS
 from ..config import get_settings
 from .retailers import WayfairRetailer, GoogleShoppingRetailer
 from .retailers.base import RetailerBase, calculate_similarity
+from .metrics import metrics
+from .deadline import budget_timeout, has_budget
+from .load import STALE_SEARCH_ONLY, load_controller
+from .cache import TTLCache
+
+
+logger = logging.getLogger(__name__)
 
 
 class ProductService:
@@ -32,6 +46,58 @@ class ProductService:
 
         self.fallback_retailer = GoogleShoppingRetailer()
 
+        # Exact brand/model results change slowly and popularity is heavy-tailed
+        # Entries are (limit fetched with, results)
+        self.exact_cache: TTLCache[tuple[int, list[ProductMatch]]] = TTLCache(
+            "exact_search",
+            max_entries=self.settings.exact_cache_max_entries,
+            ttl_seconds=self.settings.exact_cache_ttl_seconds,
+            stale_seconds=self.settings.exact_cache_stale_seconds,
+        )
+        self._exact_popularity: Counter[str] = Counter()
+        self._exact_queries: dict[str, str] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+
+        # Speculative searches started after detection, keyed by _match_key.
+        # Results are (limit fetched with, (exact, similar)).
+        self.prefetch_cache: TTLCache[tuple[int, tuple[list[ProductMatch], list[ProductMatch]]]] = TTLCache(
+            "match_prefetch",
+            max_entries=self.settings.prefetch_max_entries,
+            ttl_seconds=self.settings.prefetch_result_ttl_seconds,
+        )
+        self._prefetch_tasks: dict[tuple, asyncio.Task] = {}
+        # Keys whose prefetch holds a semaphore slot (started searching, not queued)
+        self._prefetch_running: set[tuple] = set()
+        self._prefetch_sessions: dict[tuple, set[str]] = {}
+        self._session_prefetches: dict[str, set[tuple]] = {}
+        self._prefetch_semaphore = asyncio.Semaphore(self.settings.prefetch_max_concurrency)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Smoothed share of fallback results lost to deduplication, per category
+        # ("exact" for exact searches), used to size the fallback request
+        self._duplicate_rates: OrderedDict[str, float] = OrderedDict()
+
+        # Local index of products live similar searches returned (None when disabled)
+        self.product_index = self._build_product_index()
+
+        # Synthetic scale-testing catalog for mock mode (mock_catalog_size > 0)
+        self._catalog = None
+        self._catalog_lock = threading.Lock()
+
+    def _build_product_index(self):
+        if self.settings.use_mock_products or not self.settings.product_index_enabled:
+            return None
+        from .vector_index import ProductVectorIndex
+
+        return ProductVectorIndex(
+            dim=self.settings.product_index_dim,
+            max_products=self.settings.product_index_max_products,
+            n_lists=self.settings.product_index_lists,
+            n_probe=self.settings.product_index_probes,
+            ttl_seconds=self.settings.product_index_ttl_seconds,
+            path=self.settings.product_index_path,
+        )
+
     @staticmethod
     def _build_similar_query(
         category: str,
@@ -70,6 +136,11 @@ class ProductService:
             return brand
         return None
 
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        """Cache key for a search query: case- and whitespace-insensitive."""
+        return " ".join(query.lower().split())
+
     async def get_matches(
         self, category: str, limit: int = None, description: Optional[str] = None
     ) -> list[ProductMatch]:
@@ -88,8 +159,8 @@ class ProductService:
         # Build search query
         query = description if description else f"{category} furniture"
 
-        # Get results from multi-source search
-        results = await self._search_all_sources(
+        # Get results from the local index or multi-source search
+        results = await self._search_similar(
             query=query,
             category=category,
             limit=limit,
@@ -118,10 +189,35 @@ class ProductService:
         Returns (exact_products, similar_products).
         - exact_products: Results for the identified brand/model
         - similar_products: Alternative products matching the description
+
+        Served from a speculative prefetch (see prefetch_matches) when one
+        for the same fields has finished or is still running.
         """
         if limit is None:
             limit = self.settings.default_product_limit
 
+        fields = dict(
+            category=category, description=description, identified_product=identified_product,
+            color=color, material=material, style=style, brand=brand, model_name=model_name,
+        )
+        prefetched = await self._take_prefetched(self._match_key(**fields), limit)
+        if prefetched is not None:
+            return prefetched
+        return await self._search_matches(limit=limit, **fields)
+
+    async def _search_matches(
+        self,
+        category: str,
+        limit: int,
+        description: Optional[str] = None,
+        identified_product: Optional[str] = None,
+        color: Optional[str] = None,
+        material: Optional[str] = None,
+        style: Optional[str] = None,
+        brand: Optional[str] = None,
+        model_name: Optional[str] = None,
+    ) -> tuple[list[ProductMatch], list[ProductMatch]]:
+        """Run the exact and similar searches (no prefetch lookup)."""
         # Build queries from structured fields
         similar_query = self._build_similar_query(category, description, color, material, style)
         exact_query = self._build_exact_query(brand, model_name, identified_product)
@@ -136,19 +232,194 @@ class ProductService:
 
         if exact_query:
             # Run exact and similar searches in parallel
-            exact_task = self._search_exact_all_sources(exact_query, limit)
-            similar_task = self._search_all_sources(similar_query, category, limit)
+            exact_task = self._search_exact_cached(exact_query, limit)
+            similar_task = self._search_similar(similar_query, category, limit)
 
             exact_products, similar_products = await asyncio.gather(
                 exact_task, similar_task
             )
             return exact_products, similar_products
         else:
-            similar_products = await self._search_all_sources(
+            similar_products = await self._search_similar(
                 similar_query, category, limit
             )
             return [], similar_products
 
+    async def _search_similar(
+        self, query: str, category: str, limit: int
+    ) -> list[ProductMatch]:
+        """
+        Similar products from the local index, searching live sources on a miss.
+
+        A hit needs `limit` indexed products of the category close enough to
+        the query; live results are indexed for later queries. When shedding
+        load, whatever the index holds (stale included) is all there is.
+        """
+        if load_controller.sheds(STALE_SEARCH_ONLY, "live_search"):
+            if self.product_index is None:
+                return []
+            local = self.product_index.search(
+                query, category, limit, self.settings.product_index_min_score, include_stale=True
+            )
+            for product in local:
+                product.similarity = calculate_similarity(query, product.name)
+            return local
+
+        if self.product_index is not None:
+            local = self.product_index.search(
+                query, category, limit, self.settings.product_index_min_score
+            )
+            if len(local) >= limit:
+                metrics.inc("product_index_total", result="hit")
+                for product in local:
+                    product.similarity = calculate_similarity(query, product.name)
+                return local
+            metrics.inc("product_index_total", result="miss")
+
+        results = await self._search_all_sources(query, category, limit)
+        if self.product_index is not None:
+            self.product_index.add(results, category)
+        return results
+
+    async def save_product_index(self):
+        """Persist the local product index (called at shutdown)."""
+        if self.product_index is None or not self.settings.product_index_path:
+            return
+        try:
+            await asyncio.to_thread(self.product_index.save, self.product_index.metadata())
+        except OSError as e:
+            logger.warning("Could not save product index: %s", e)
+
+    @classmethod
+    def _match_key(cls, **fields: Optional[str]) -> tuple:
+        """Prefetch key: every field that shapes the searches, normalized."""
+        return tuple(
+            cls._normalize_query(fields[name]) if fields.get(name) else ""
+            for name in (
+                "category", "description", "identified_product", "color",
+                "material", "style", "brand", "model_name",
+            )
+        )
+
+    def prefetch_matches(self, session_id: Optional[str], detections: list[Any]):
+        """
+        Start background match searches for each detection of a session.
+
+        Uses the fields the client sends back to /api/products/match, so the
+        follow-up calls hit. Searches run in a fresh context (outside the
+        detect request's deadline and timing), at most prefetch_max_concurrency
+        at a time; beyond prefetch_max_pending they are dropped. Identical
+        searches are shared, and cancelled once every session that wanted
+        them has expired (see cancel_session_prefetches).
+        """
+        if not self.settings.prefetch_matches:
+            return
+        self._loop = asyncio.get_running_loop()
+
+        for detection in detections:
+            fields = dict(
+                category=detection.label,
+                description=detection.description,
+                identified_product=detection.identified_product,
+                color=detection.color,
+                material=detection.material,
+                style=detection.style,
+                brand=detection.brand,
+                model_name=detection.model_name,
+            )
+            key = self._match_key(**fields)
+            if key not in self._prefetch_tasks:
+                age = self.prefetch_cache.age(key)
+                if age is not None and age < self.prefetch_cache.ttl:
+                    continue
+                if len(self._prefetch_tasks) >= self.settings.prefetch_max_pending:
+                    metrics.inc("prefetch_total", event="dropped")
+                    continue
+                task = asyncio.create_task(
+                    self._run_prefetch(key, fields), context=contextvars.Context()
+                )
+                task.add_done_callback(lambda _, key=key: self._forget_prefetch(key))
+                self._prefetch_tasks[key] = task
+                metrics.inc("prefetch_total", event="started")
+
+            if session_id is not None:
+                self._prefetch_sessions.setdefault(key, set()).add(session_id)
+                self._session_prefetches.setdefault(session_id, set()).add(key)
+        metrics.set_gauge("prefetch_in_flight", len(self._prefetch_tasks))
+
+    async def _run_prefetch(self, key: tuple, fields: dict):
+        limit = self.settings.default_product_limit
+        async with self._prefetch_semaphore:
+            self._prefetch_running.add(key)
+            try:
+                with metrics.track("prefetch"):
+                    results = await self._search_matches(limit=limit, **fields)
+            except Exception as e:
+                logger.warning("Match prefetch failed for %s: %s", fields["category"], e)
+                return
+            finally:
+                self._prefetch_running.discard(key)
+        self.prefetch_cache.set(key, (limit, results))
+
+    def _forget_prefetch(self, key: tuple):
+        self._prefetch_tasks.pop(key, None)
+        self._prefetch_sessions.pop(key, None)
+        metrics.set_gauge("prefetch_in_flight", len(self._prefetch_tasks))
+
+    async def _take_prefetched(
+        self, key: tuple, limit: int
+    ) -> Optional[tuple[list[ProductMatch], list[ProductMatch]]]:
+        """
+        Prefetched results for `key`, copied; None to search directly.
+
+        Joins a prefetch that is already searching for at most the request's
+        remaining budget (prefetches run outside any deadline). One still
+        queued behind other prefetches isn't waited for.
+        """
+        task = self._prefetch_tasks.get(key)
+        if task is not None:
+            if key not in self._prefetch_running:
+                metrics.inc("prefetch_total", event="join_queued")
+                return None
+            metrics.inc("prefetch_total", event="joined")
+            # wait() (unlike awaiting the task) leaves the shared search running
+            # if this request is cancelled or gives up
+            done, _ = await asyncio.wait(
+                {task}, timeout=budget_timeout(self.settings.prefetch_join_timeout_seconds)
+            )
+            if not done:
+                metrics.inc("prefetch_total", event="join_timeout")
+                return None
+
+        cached = self.prefetch_cache.get(key)
+        if cached is None or cached[0] < limit:
+            return None
+        exact, similar = cached[1]
+        return (
+            [p.model_copy() for p in exact[:limit]],
+            [p.model_copy() for p in similar[:limit]],
+        )
+
+    def cancel_session_prefetches(self, session_id: str):
+        """Session expired: cancel prefetches no other live session is waiting on.
+
+        Safe to call from any thread (the image store calls it from its cleanup thread).
+        """
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._cancel_session_prefetches, session_id)
+
+    def _cancel_session_prefetches(self, session_id: str):
+        for key in self._session_prefetches.pop(session_id, set()):
+            sessions = self._prefetch_sessions.get(key)
+            if sessions is None:
+                continue
+            sessions.discard(session_id)
+            task = self._prefetch_tasks.get(key)
+            if not sessions and task is not None and not task.done():
+                task.cancel()
+                metrics.inc("prefetch_total", event="cancelled")
+
     async def _search_all_sources(
         self,
         query: str,
@@ -169,7 +440,9 @@ class ProductService:
 
         if available_partners:
             partner_tasks = [
-                retailer.search(query, category, limit)
+                self._tracked_search(
+                    "partner_search", retailer, retailer.search(query, category, limit)
+                )
                 for retailer in available_partners
             ]
             partner_results = await asyncio.gather(*partner_tasks, return_exceptions=True)
@@ -180,12 +453,17 @@ class ProductService:
 
         # Step 2: Fall back to Google Shopping if not enough partner results
         if len(all_results) < self.settings.min_partner_results:
-            if self.fallback_retailer.is_available():
-                needed = limit - len(all_results)
-                fallback_results = await self.fallback_retailer.search(
-                    query, category, needed
+            if self.fallback_retailer.is_available() and self._fallback_fits_budget(all_results):
+                duplicate_key = self._normalize_query(category or query)
+                needed = self._overfetch_count(all_results, limit, duplicate_key)
+                metrics.inc("search_fallback_total", kind="similar")
+                fallback_results = await self._tracked_search(
+                    "fallback_search",
+                    self.fallback_retailer,
+                    self.fallback_retailer.search(query, category, needed),
                 )
                 all_results.extend(fallback_results)
+                return self._deduplicate_fallback(all_results, limit, duplicate_key, "similar")
 
         # Step 3: Deduplicate by product name similarity and return up to limit
         deduplicated = self._deduplicate_results(all_results)
@@ -208,7 +486,9 @@ class ProductService:
 
         if available_partners:
             partner_tasks = [
-                retailer.search_exact(product_name, limit)
+                self._tracked_search(
+                    "exact_partner_search", retailer, retailer.search_exact(product_name, limit)
+                )
                 for retailer in available_partners
             ]
             partner_results = await asyncio.gather(*partner_tasks, return_exceptions=True)
@@ -219,16 +499,212 @@ class ProductService:
 
         # Fall back to Google Shopping if not enough results
         if len(all_results) < self.settings.min_partner_results:
-            if self.fallback_retailer.is_available():
-                needed = limit - len(all_results)
-                fallback_results = await self.fallback_retailer.search_exact(
-                    product_name, needed
+            if self.fallback_retailer.is_available() and self._fallback_fits_budget(all_results):
+                needed = self._overfetch_count(all_results, limit, "exact")
+                metrics.inc("search_fallback_total", kind="exact")
+                fallback_results = await self._tracked_search(
+                    "exact_fallback_search",
+                    self.fallback_retailer,
+                    self.fallback_retailer.search_exact(product_name, needed),
                 )
                 all_results.extend(fallback_results)
+                return self._deduplicate_fallback(all_results, limit, "exact", "exact")
 
         deduplicated = self._deduplicate_results(all_results)
         return deduplicated[:limit]
 
+    async def _search_exact_cached(self, product_name: str, limit: int) -> list[ProductMatch]:
+        """
+        Exact search served from the long-TTL cache when possible.
+
+        Results are fetched at (at least) the default limit so one entry serves
+        every common request size, and copied on the way out because callers
+        rescore products in place. When shedding load, only cached (possibly
+        stale) results are served.
+        """
+        if load_controller.sheds(STALE_SEARCH_ONLY, "live_search"):
+            cached = self.exact_cache.get(self._normalize_query(product_name), allow_stale=True)
+            return [p.model_copy() for p in cached[1][:limit]] if cached is not None else []
+
+        if not self.settings.exact_cache_enabled:
+            return await self._search_exact_all_sources(product_name, limit)
+
+        key = self._normalize_query(product_name)
+        self._record_popularity(key, product_name)
+
+        cached = self.exact_cache.get(key)
+        if cached is not None and cached[0] >= limit:
+            products = cached[1]
+        else:
+            products = await self._fetch_exact(
+                key, product_name, max(limit, self.settings.default_product_limit)
+            )
+        return [p.model_copy() for p in products[:limit]]
+
+    async def _fetch_exact(self, key: str, product_name: str, limit: int) -> list[ProductMatch]:
+        """Run the exact search and cache non-empty results."""
+        products = await self._search_exact_all_sources(product_name, limit)
+        if products:
+            self.exact_cache.set(key, (limit, products))
+        return products
+
+    def _record_popularity(self, key: str, product_name: str):
+        """Count a request for an exact query (bounded to a multiple of the refresh set)."""
+        self._exact_popularity[key] += 1
+        self._exact_queries.setdefault(key, product_name)
+        if len(self._exact_popularity) > self.settings.exact_cache_refresh_top_n * 10:
+            keep = dict(self._exact_popularity.most_common(self.settings.exact_cache_refresh_top_n * 2))
+            self._exact_popularity = Counter(keep)
+            self._exact_queries = {k: v for k, v in self._exact_queries.items() if k in keep}
+
+    async def refresh_exact_cache(self, queries: list[str]):
+        """Re-fetch exact results for queries that are missing or close to expiring."""
+        if load_controller.sheds(STALE_SEARCH_ONLY, "cache_refresh"):
+            return
+        refresh_age = max(
+            0, self.settings.exact_cache_ttl_seconds - 2 * self.settings.exact_cache_refresh_interval_seconds
+        )
+        due = []
+        for query in queries:
+            key = self._normalize_query(query)
+            age = self.exact_cache.age(key)
+            if age is None or age >= refresh_age:
+                due.append((key, query))
+
+        semaphore = asyncio.Semaphore(self.settings.exact_cache_refresh_concurrency)
+
+        async def refresh_one(key: str, query: str):
+            async with semaphore:
+                try:
+                    with metrics.track("exact_cache_refresh"):
+                        await self._fetch_exact(key, query, self.settings.default_product_limit)
+                except Exception as e:
+                    logger.warning("Exact cache refresh failed for %r: %s", query, e)
+
+        await asyncio.gather(*[refresh_one(key, query) for key, query in due])
+
+    def start_background_refresh(self):
+        """Warm the exact cache and keep popular entries fresh (called at startup)."""
+        if (
+            self.settings.use_mock_products
+            or not self.settings.exact_cache_enabled
+            or self._refresh_task is not None
+        ):
+            return
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop_background_refresh(self):
+        """Cancel the refresh loop (called at shutdown)."""
+        if self._refresh_task is None:
+            return
+        self._refresh_task.cancel()
+        try:
+            await self._refresh_task
+        except asyncio.CancelledError:
+            pass
+        self._refresh_task = None
+
+    async def _refresh_loop(self):
+        """Pre-warm from seeds and the saved ranking, then refresh the most-requested queries."""
+        saved = await asyncio.to_thread(self._load_popularity)
+        self._exact_popularity.update(saved)
+        for key in saved:
+            self._exact_queries.setdefault(key, key)
+        await self.refresh_exact_cache(self._popular_exact_queries())
+
+        while True:
+            await asyncio.sleep(self.settings.exact_cache_refresh_interval_seconds)
+            await self.refresh_exact_cache(self._popular_exact_queries())
+            top = dict(self._exact_popularity.most_common(self.settings.exact_cache_refresh_top_n))
+            await asyncio.to_thread(self._save_popularity, top)
+            self._decay_popularity()
+
+    def _decay_popularity(self):
+        """Halve counts each cycle so the ranking follows recent demand."""
+        self._exact_popularity = Counter(
+            {k: c // 2 for k, c in self._exact_popularity.items() if c > 1}
+        )
+        self._exact_queries = {
+            k: v for k, v in self._exact_queries.items() if k in self._exact_popularity
+        }
+
+    def _popular_exact_queries(self) -> list[str]:
+        """Configured warm queries plus the top requested ones."""
+        queries = {self._normalize_query(q): q for q in self.settings.exact_cache_warm_queries}
+        for key, _ in self._exact_popularity.most_common(self.settings.exact_cache_refresh_top_n):
+            queries.setdefault(key, self._exact_queries.get(key, key))
+        return list(queries.values())
+
+    def _load_popularity(self) -> dict[str, int]:
+        path = self.settings.exact_cache_popularity_file
+        if not path or not os.path.exists(path):
+            return {}
+        try:
+            with open(path) as f:
+                return {self._normalize_query(k): int(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning("Could not read exact cache popularity file: %s", e)
+            return {}
+
+    def _save_popularity(self, top: dict[str, int]):
+        path = self.settings.exact_cache_popularity_file
+        if not path:
+            return
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(top, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write exact cache popularity file: %s", e)
+
+    def _fallback_fits_budget(self, partner_results: list[ProductMatch]) -> bool:
+        """
+        Whether to spend deadline budget on the fallback search.
+
+        With no partner results at all the fallback is the only source, so it
+        always runs; otherwise it is optional and needs the minimum budget.
+        """
+        if not partner_results:
+            return True
+        return has_budget("fallback_search", self.settings.fallback_search_min_budget_seconds)
+
+    @staticmethod
+    async def _tracked_search(
+        stage: str, retailer: RetailerBase, search: Awaitable[list[ProductMatch]]
+    ) -> list[ProductMatch]:
+        """Await a retailer search while recording its latency and outcome."""
+        with metrics.track(stage, timing=stage, timing_desc=retailer.name, retailer=retailer.name):
+            return await search
+
+    def _overfetch_count(self, partner_results: list[ProductMatch], limit: int, key: str) -> int:
+        """
+        How many fallback results to ask for so one round trip fills `limit`.
+
+        Scales the shortfall by the duplicate rate observed for this key, so
+        results lost to deduplication are fetched up front.
+        """
+        needed = limit - len(self._deduplicate_results(partner_results))
+        rate = self._duplicate_rates.get(key, self.settings.fallback_duplicate_rate_prior)
+        factor = min(1 / (1 - rate), self.settings.fallback_max_overfetch_factor)
+        return max(1, math.ceil(needed * factor))
+
+    def _deduplicate_fallback(
+        self, products: list[ProductMatch], limit: int, key: str, kind: str
+    ) -> list[ProductMatch]:
+        """Deduplicate partner + fallback results, learning the duplicate rate for `key`."""
+        deduplicated = self._deduplicate_results(products)
+        if products:
+            observed = 1 - len(deduplicated) / len(products)
+            previous = self._duplicate_rates.pop(key, self.settings.fallback_duplicate_rate_prior)
+            alpha = self.settings.fallback_duplicate_rate_alpha
+            self._duplicate_rates[key] = (1 - alpha) * previous + alpha * observed
+            while len(self._duplicate_rates) > self.settings.fallback_duplicate_rate_max_keys:
+                self._duplicate_rates.popitem(last=False)
+        if len(deduplicated) < limit:
+            metrics.inc("search_fallback_short_total", kind=kind)
+        return deduplicated[:limit]
+
     def _deduplicate_results(
         self, products: list[ProductMatch]
     ) -> list[ProductMatch]:
@@ -280,10 +756,32 @@ class ProductService:
             )
         return mock_exact
 
+    def _catalog_store(self):
+        """The synthetic catalog (when mock_catalog_size is set), built on first use."""
+        if self.settings.mock_catalog_size <= 0:
+            return None
+        with self._catalog_lock:
+            if self._catalog is None:
+                from .catalog_store import build_catalog_store
+
+                self._catalog = build_catalog_store(
+                    self.settings.mock_catalog_size, self.settings.mock_catalog_seed
+                )
+        return self._catalog
+
+    async def load_catalog(self):
+        """Build the synthetic catalog off the event loop (called at startup)."""
+        if self.settings.use_mock_products and self.settings.mock_catalog_size > 0:
+            await asyncio.to_thread(self._catalog_store)
+
     def _get_mock_matches(
         self, category: str, limit: int, search_query: str = ""
     ) -> list[ProductMatch]:
-        """Get mock product matches from our sample data."""
+        """Get mock product matches from the synthetic catalog or our sample data."""
+        catalog = self._catalog_store()
+        if catalog is not None:
+            return catalog.search(search_query or f"{category} furniture", category, limit)
+
         category_lower = category.lower()
 
         # Find products matching the category
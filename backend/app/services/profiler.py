@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from types import FrameType
+from typing import Optional
+
+
+# Leaf frames that mean a thread is parked rather than doing work
+IDLE_LEAF_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("image_store.py", "_cleanup_loop"),
+}
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another one is running."""
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler over every Python thread in the process.
+
+    A background thread snapshots sys._current_frames() at a fixed interval,
+    which covers the event loop thread as well as executor threads without
+    instrumenting any code. Output is in the collapsed-stack format consumed
+    by flamegraph.pl, speedscope and similar tools:
+
+        <thread>;<outer frame>;...;<leaf frame> <sample count>
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def profile(
+        self,
+        seconds: float,
+        interval: float = 0.01,
+        include_idle: bool = False,
+    ) -> tuple[str, int]:
+        """
+        Sample all threads for `seconds` and return (collapsed_stacks, sample_count).
+
+        Blocks the calling thread; call it via asyncio.to_thread from async code.
+        Raises ProfilerBusyError if another profile is already running.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+
+        try:
+            stacks: Counter[str] = Counter()
+            samples = 0
+            own_thread = threading.get_ident()
+            deadline = time.monotonic() + seconds
+
+            while time.monotonic() < deadline:
+                thread_names = {t.ident: t.name for t in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    if not include_idle and self._is_idle(frame):
+                        continue
+                    thread_name = thread_names.get(thread_id, f"thread-{thread_id}")
+                    stacks[self._collapse(thread_name, frame)] += 1
+                samples += 1
+                time.sleep(interval)
+
+            lines = [f"{stack} {count}" for stack, count in stacks.most_common()]
+            return "\n".join(lines) + ("\n" if lines else ""), samples
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _frame_label(frame: FrameType) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _collapse(self, thread_name: str, frame: Optional[FrameType]) -> str:
+        labels = []
+        while frame is not None:
+            labels.append(self._frame_label(frame))
+            frame = frame.f_back
+        labels.append(thread_name.replace(" ", "_"))
+        # Collapsed stacks are root-first and use ';' as the separator
+        return ";".join(label.replace(";", ":") for label in reversed(labels))
+
+    @staticmethod
+    def _is_idle(frame: FrameType) -> bool:
+        code = frame.f_code
+        return (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAF_FRAMES
+
+
+# Singleton instance
+profiler = SamplingProfiler()
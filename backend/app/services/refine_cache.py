@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from typing import Optional
+from ..config import get_settings
+from .metrics import metrics
+
+
+# The hash is grayscale, so a hit may be the same piece in another colour:
+# only identity fields are reused, colour and description come from this photo
+CACHED_FIELDS = ("brand", "model_name", "material", "style", "estimated_price_range")
+
+# Only results that identified the product are cached
+REQUIRED_FIELDS = ("brand", "model_name")
+
+
+class RefinementCache:
+    """
+    Second-pass (focused) detection results, looked up by crop similarity.
+
+    Entries are grouped by (label, model) and keyed by a 64-bit difference hash
+    of the cropped region. A lookup returns the closest entry within
+    `max_distance` differing bits (kept small: the brand and model it carries
+    are attached to the new detection and drive the product search), and
+    only if the stored label matches and the crop's aspect ratio is within
+    `max_aspect_ratio_diff`. Only results naming both a brand and a model
+    are stored, and only their CACHED_FIELDS. Each group is a bounded LRU,
+    and so is the set of groups, which keeps the linear Hamming scan short.
+    Only used from the event loop, so no locking.
+    """
+
+    def __init__(
+        self, max_distance: int, max_aspect_ratio_diff: float, max_per_label: int, max_labels: int
+    ):
+        self._max_distance = max_distance
+        self._max_aspect_ratio_diff = max_aspect_ratio_diff
+        self._max_per_label = max_per_label
+        self._max_labels = max_labels
+        # fingerprint -> (label, aspect ratio, fields)
+        self._groups: OrderedDict[tuple[str, str], OrderedDict[int, tuple[str, float, dict]]] = OrderedDict()
+        self._size = 0
+
+    def _compatible(self, entry: tuple[str, float, dict], label: str, aspect_ratio: float) -> bool:
+        cached_label, cached_ratio, _ = entry
+        ratio = max(cached_ratio, aspect_ratio) / min(cached_ratio, aspect_ratio)
+        return cached_label == label and ratio - 1 <= self._max_aspect_ratio_diff
+
+    def get(self, label: str, model_name: str, fingerprint: int, aspect_ratio: float) -> Optional[dict]:
+        """Closest compatible cached result for this label and model, or None."""
+        label = label.lower()
+        key = (label, model_name)
+        group = self._groups.get(key)
+        match = None
+        if group is not None:
+            best_distance = self._max_distance + 1
+            for candidate, entry in group.items():
+                distance = (candidate ^ fingerprint).bit_count()
+                if distance < best_distance and self._compatible(entry, label, aspect_ratio):
+                    match, best_distance = candidate, distance
+
+        if match is None:
+            metrics.inc("refine_cache_total", result="miss")
+            return None
+
+        self._groups.move_to_end(key)
+        group.move_to_end(match)
+        metrics.inc("refine_cache_total", result="hit")
+        return group[match][2]
+
+    def put(self, label: str, model_name: str, fingerprint: int, aspect_ratio: float, result: dict):
+        """Store an identified result, evicting the least recently used entry or label group."""
+        if not all(result.get(field) for field in REQUIRED_FIELDS):
+            return
+        label = label.lower()
+        key = (label, model_name)
+        group = self._groups.get(key)
+        if group is None:
+            if len(self._groups) >= self._max_labels:
+                _, evicted = self._groups.popitem(last=False)
+                self._size -= len(evicted)
+            group = self._groups[key] = OrderedDict()
+        self._groups.move_to_end(key)
+
+        if fingerprint not in group:
+            self._size += 1
+            if len(group) >= self._max_per_label:
+                group.popitem(last=False)
+                self._size -= 1
+        fields = {field: result[field] for field in CACHED_FIELDS if result.get(field)}
+        group[fingerprint] = (label, aspect_ratio, fields)
+        group.move_to_end(fingerprint)
+        metrics.set_gauge("refine_cache_entries", self._size)
+
+
+def _build_refinement_cache() -> RefinementCache:
+    settings = get_settings()
+    return RefinementCache(
+        max_distance=settings.refine_cache_max_distance,
+        max_aspect_ratio_diff=settings.refine_cache_max_aspect_ratio_diff,
+        max_per_label=settings.refine_cache_max_per_label,
+        max_labels=settings.refine_cache_max_labels,
+    )
+
+
+# Singleton instance
+refinement_cache = _build_refinement_cache()
+
+metrics.describe("refine_cache_total", "Refinement cache lookups, by result (hit/miss).")
+metrics.describe("refine_cache_entries", "Entries held in the refinement cache.")
@@ -0,0 +1,116 @@
+import logging
+import asyncio
+import secrets
+import contextvars
+from typing import Awaitable, Optional
+from ..config import get_settings
+from ..models.product import ProductMatch, RerankResponse
+from .cache import TTLCache
+from .metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class RerankJob:
+    """A visual re-rank running after the text-ranked match response was sent."""
+
+    def __init__(self, token: str):
+        self.token = token
+        self.status = "pending"
+        self.exact_products: list[ProductMatch] = []
+        self.similar_products: list[ProductMatch] = []
+        self.error: Optional[str] = None
+        self._done = asyncio.Event()
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for the re-rank; True once it has finished."""
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._done.is_set()
+
+    def finish(
+        self,
+        exact_products: list[ProductMatch],
+        similar_products: list[ProductMatch],
+        error: Optional[str] = None,
+    ):
+        self.status = "failed" if error else "ready"
+        self.exact_products = exact_products
+        self.similar_products = similar_products
+        self.error = error
+        self._done.set()
+
+    def as_response(self) -> RerankResponse:
+        return RerankResponse(
+            rerank_token=self.token,
+            status=self.status,
+            products=self.exact_products + self.similar_products,
+            exact_products=self.exact_products,
+            similar_products=self.similar_products,
+            error=self.error,
+        )
+
+
+class RerankRegistry:
+    """
+    Background visual re-ranks, looked up by token.
+
+    Jobs run in a fresh context (the originating request's deadline and
+    timing no longer apply once its response is sent), bounded by
+    `timeout` seconds, and stay retrievable for `ttl` seconds.
+    """
+
+    def __init__(self, ttl_seconds: float, max_jobs: int, timeout_seconds: float):
+        self._jobs: TTLCache[RerankJob] = TTLCache("rerank_jobs", max_jobs, ttl_seconds)
+        self._timeout = timeout_seconds
+        self._tasks: set[asyncio.Task] = set()
+
+    def start(
+        self,
+        work: Awaitable[tuple[list[ProductMatch], list[ProductMatch]]],
+        fallback: tuple[list[ProductMatch], list[ProductMatch]],
+    ) -> RerankJob:
+        """Run `work` in the background; `fallback` (text ranking) is served if it fails."""
+        job = RerankJob(secrets.token_urlsafe(16))
+        self._jobs.set(job.token, job)
+        task = asyncio.create_task(self._run(job, work, fallback), context=contextvars.Context())
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, token: str) -> Optional[RerankJob]:
+        return self._jobs.get(token)
+
+    async def _run(self, job: RerankJob, work: Awaitable, fallback: tuple):
+        try:
+            with metrics.track("rerank"):
+                exact_products, similar_products = await asyncio.wait_for(work, timeout=self._timeout)
+        except asyncio.TimeoutError:
+            metrics.inc("rerank_jobs_total", outcome="timeout")
+            job.finish(*fallback, error="Visual re-rank timed out")
+        except Exception as e:
+            logger.warning("Visual re-rank failed, keeping text ranking: %s", e)
+            metrics.inc("rerank_jobs_total", outcome="error")
+            job.finish(*fallback, error=str(e))
+        else:
+            metrics.inc("rerank_jobs_total", outcome="success")
+            job.finish(exact_products, similar_products)
+
+
+def _build_rerank_registry() -> RerankRegistry:
+    settings = get_settings()
+    return RerankRegistry(
+        ttl_seconds=settings.rerank_result_ttl_seconds,
+        max_jobs=settings.rerank_max_jobs,
+        timeout_seconds=settings.rerank_timeout_seconds,
+    )
+
+
+# Singleton instance
+rerank_jobs = _build_rerank_registry()
+
+metrics.describe("rerank_jobs_total", "Deferred visual re-ranks, by outcome (success/timeout/error).")
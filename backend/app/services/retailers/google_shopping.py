@@ -1,9 +1,104 @@
+import logging
+import asyncio
 import hashlib
+import contextvars
 from typing import Optional
 import httpx
 from .base import RetailerBase, calculate_similarity
 from ...models.product import ProductMatch
 from ...config import get_settings
+from ..metrics import metrics
+from ..concurrency import upstream
+from ..deadline import budget_timeout
+
+
+logger = logging.getLogger(__name__)
+
+
+SERPER_SHOPPING_URL = "https://google.serper.dev/shopping"
+
+
+class SerperBatcher:
+    """
+    Coalesces concurrent Serper shopping queries into batched requests.
+
+    Queries arriving within `window_seconds` of the first (up to
+    `max_queries`) are sent as one POST with a JSON array body, and each
+    caller gets its own entry of the array response. A lone query is sent
+    as a plain object, as before. The batch runs outside any one caller's
+    deadline, with the longest timeout among its callers; each caller still
+    waits only for its own timeout.
+    """
+
+    def __init__(self, window_seconds: float, max_queries: int):
+        self.window = window_seconds
+        self.max_queries = max_queries
+        self._pending: list[tuple[dict, float, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def query(self, payload: dict, timeout: float) -> dict:
+        """Run one shopping query ({"q": ..., "num": ...}) as part of a batch."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((payload, timeout, future))
+        if len(self._pending) >= self.max_queries:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        try:
+            # shield: a caller giving up doesn't cancel the others' batch
+            return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise httpx.TimeoutException("Serper batch timed out") from None
+        finally:
+            if not future.done():
+                # Nobody will read this caller's result or error; _send skips
+                # cancelled futures, and an unsent query is dropped from the batch
+                future.cancel()
+                self._pending = [entry for entry in self._pending if entry[2] is not future]
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._send(batch), context=contextvars.Context())
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: list[tuple[dict, float, asyncio.Future]]):
+        payloads = [payload for payload, _, _ in batch]
+        metrics.inc("serper_batches_total")
+        metrics.inc("serper_batched_queries_total", len(batch))
+        try:
+            async with upstream("serper").slot(), httpx.AsyncClient() as client:
+                response = await client.post(
+                    SERPER_SHOPPING_URL,
+                    json=payloads if len(payloads) > 1 else payloads[0],
+                    headers={
+                        "X-API-KEY": get_settings().serper_api_key,
+                        "Content-Type": "application/json",
+                    },
+                    timeout=max(timeout for _, timeout, _ in batch),
+                )
+                response.raise_for_status()
+                data = response.json()
+            results = data if len(payloads) > 1 else [data]
+            if not isinstance(results, list) or len(results) != len(batch):
+                raise ValueError(f"Serper returned {len(results)} results for {len(batch)} queries")
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
 
 
 class GoogleShoppingRetailer(RetailerBase):
@@ -19,6 +114,10 @@ class GoogleShoppingRetailer(RetailerBase):
 
     def __init__(self):
         self.settings = get_settings()
+        self._batcher = SerperBatcher(
+            window_seconds=self.settings.serper_batch_window_ms / 1000,
+            max_queries=self.settings.serper_batch_max_queries,
+        )
 
     def is_available(self) -> bool:
         """Check if Serper API is configured."""
@@ -43,22 +142,14 @@ class GoogleShoppingRetailer(RetailerBase):
         similarity_query = query if query else category
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://google.serper.dev/shopping",
-                    json={"q": search_query, "num": limit},
-                    headers={
-                        "X-API-KEY": self.settings.serper_api_key,
-                        "Content-Type": "application/json",
-                    },
-                    timeout=10.0,
+            with metrics.track("serper_request", kind="similar"):
+                data = await self._batcher.query(
+                    {"q": search_query, "num": limit}, timeout=budget_timeout(10.0)
                 )
-                response.raise_for_status()
-                data = response.json()
 
             return self._parse_results(data, limit, similarity_query=similarity_query)
         except Exception as e:
-            print(f"Google Shopping search failed: {e}")
+            logger.warning("Google Shopping search failed: %s", e)
             return []
 
     async def search_exact(
@@ -73,23 +164,15 @@ class GoogleShoppingRetailer(RetailerBase):
         query = f"{product_name} buy"
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://google.serper.dev/shopping",
-                    json={"q": query, "num": limit},
-                    headers={
-                        "X-API-KEY": self.settings.serper_api_key,
-                        "Content-Type": "application/json",
-                    },
-                    timeout=10.0,
+            with metrics.track("serper_request", kind="exact"):
+                data = await self._batcher.query(
+                    {"q": query, "num": limit}, timeout=budget_timeout(10.0)
                 )
-                response.raise_for_status()
-                data = response.json()
 
             # Use original product name for similarity (without "buy")
             return self._parse_results(data, limit, is_exact=True, similarity_query=product_name)
         except Exception as e:
-            print(f"Google Shopping exact search failed: {e}")
+            logger.warning("Google Shopping exact search failed: %s", e)
             return []
 
     def _parse_results(
@@ -135,3 +218,7 @@ class GoogleShoppingRetailer(RetailerBase):
             return float(cleaned) if cleaned else 0.0
         except ValueError:
             return 0.0
+
+
+metrics.describe("serper_batches_total", "HTTP requests sent to Serper (each may carry several queries).")
+metrics.describe("serper_batched_queries_total", "Shopping queries sent to Serper, across all batches.")
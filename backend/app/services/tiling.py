@@ -0,0 +1,203 @@
+import io
+import math
+from dataclasses import dataclass, field
+from typing import Optional
+from PIL import Image as PILImage
+from ..models.detection import BoundingBox, DetectedFurniture
+
+
+# A box within this fraction of a tile edge is treated as cut off by that edge
+EDGE_TOLERANCE = 0.02
+
+# Same-label boxes where the smaller lies this much inside the larger are duplicates
+CONTAINMENT_THRESHOLD = 0.8
+
+# Pieces cut by a seam must overlap this much along it to be joined
+SEAM_CROSS_OVERLAP = 0.5
+
+
+@dataclass(frozen=True)
+class Tile:
+    """A normalized region of the full image."""
+
+    x: float
+    y: float
+    width: float
+    height: float
+
+    def box(self) -> dict:
+        return {"x": self.x, "y": self.y, "width": self.width, "height": self.height}
+
+
+@dataclass
+class TileDetection:
+    """A detection in full-image coordinates plus the box edges a tile seam cut off."""
+
+    detection: DetectedFurniture
+    clipped: set[str] = field(default_factory=set)
+
+
+def image_size(image_bytes: bytes) -> tuple[int, int]:
+    """Pixel dimensions read from the image header (no full decode)."""
+    with PILImage.open(io.BytesIO(image_bytes)) as img:
+        return img.size
+
+
+def _spans(count: int, overlap: float) -> list[tuple[float, float]]:
+    """(start, length) of `count` equal spans covering [0, 1] with the given overlap."""
+    if count == 1:
+        return [(0.0, 1.0)]
+    length = 1.0 / (count - (count - 1) * overlap)
+    step = length * (1 - overlap)
+    return [(i * step, length) for i in range(count)]
+
+
+def plan_tiles(
+    width: int,
+    height: int,
+    target_size: int,
+    overlap: float,
+    max_tiles: int,
+    min_pixels: int,
+) -> list[Tile]:
+    """
+    Overlapping tiles of roughly target_size pixels covering the image.
+
+    Returns an empty list when the image is too small to be worth tiling.
+    Panoramas get more columns than rows; the grid is shrunk along its longer
+    side until it fits max_tiles.
+    """
+    if width * height < min_pixels:
+        return []
+
+    cols = max(1, math.ceil(width / target_size))
+    rows = max(1, math.ceil(height / target_size))
+    while cols * rows > max_tiles:
+        if cols >= rows:
+            cols -= 1
+        else:
+            rows -= 1
+    if cols * rows <= 1:
+        return []
+
+    return [
+        Tile(x=x, y=y, width=w, height=h)
+        for y, h in _spans(rows, overlap)
+        for x, w in _spans(cols, overlap)
+    ]
+
+
+def to_image_coordinates(detection: DetectedFurniture, tile: Tile) -> TileDetection:
+    """Map a detection made on a tile back to normalized full-image coordinates."""
+    b = detection.boundingBox
+    clipped = set()
+    if tile.x > 0 and b.x <= EDGE_TOLERANCE:
+        clipped.add("left")
+    if tile.x + tile.width < 1 and b.x + b.width >= 1 - EDGE_TOLERANCE:
+        clipped.add("right")
+    if tile.y > 0 and b.y <= EDGE_TOLERANCE:
+        clipped.add("top")
+    if tile.y + tile.height < 1 and b.y + b.height >= 1 - EDGE_TOLERANCE:
+        clipped.add("bottom")
+
+    x = min(1.0, tile.x + b.x * tile.width)
+    y = min(1.0, tile.y + b.y * tile.height)
+    box = BoundingBox(
+        x=x,
+        y=y,
+        width=min(1.0 - x, b.width * tile.width),
+        height=min(1.0 - y, b.height * tile.height),
+    )
+    return TileDetection(detection.model_copy(update={"boundingBox": box}), clipped)
+
+
+def _intersection(a: BoundingBox, b: BoundingBox) -> float:
+    dx = min(a.x + a.width, b.x + b.width) - max(a.x, b.x)
+    dy = min(a.y + a.height, b.y + b.height) - max(a.y, b.y)
+    return dx * dy if dx > 0 and dy > 0 else 0.0
+
+
+def _is_duplicate(a: BoundingBox, b: BoundingBox, iou_threshold: float) -> bool:
+    """High IoU, or one box (mostly) inside the other."""
+    inter = _intersection(a, b)
+    if inter <= 0:
+        return False
+    area_a = a.width * a.height
+    area_b = b.width * b.height
+    if inter / (area_a + area_b - inter) >= iou_threshold:
+        return True
+    return inter / min(area_a, area_b) >= CONTAINMENT_THRESHOLD
+
+
+def _seam_edges(a: TileDetection, b: TileDetection) -> Optional[tuple[str, str]]:
+    """The (a edge, b edge) pair if a and b are two pieces of one object cut by a seam."""
+    ba, bb = a.detection.boundingBox, b.detection.boundingBox
+    if _intersection(ba, bb) <= 0:
+        return None
+
+    for edge, opposite in (("right", "left"), ("left", "right"), ("bottom", "top"), ("top", "bottom")):
+        if edge not in a.clipped or opposite not in b.clipped:
+            continue
+        if edge in ("right", "left"):
+            # Vertical seam: the pieces must sit side by side and share most of their height
+            ordered = ba.x < bb.x if edge == "right" else bb.x < ba.x
+            overlap = min(ba.y + ba.height, bb.y + bb.height) - max(ba.y, bb.y)
+            extent = min(ba.height, bb.height)
+        else:
+            ordered = ba.y < bb.y if edge == "bottom" else bb.y < ba.y
+            overlap = min(ba.x + ba.width, bb.x + bb.width) - max(ba.x, bb.x)
+            extent = min(ba.width, bb.width)
+        if ordered and extent > 0 and overlap / extent >= SEAM_CROSS_OVERLAP:
+            return edge, opposite
+    return None
+
+
+def _join(a: TileDetection, b: TileDetection, edges: tuple[str, str]) -> TileDetection:
+    """Union of two seam pieces, keeping a's (the more confident) attributes."""
+    ba, bb = a.detection.boundingBox, b.detection.boundingBox
+    x, y = min(ba.x, bb.x), min(ba.y, bb.y)
+    box = BoundingBox(
+        x=x,
+        y=y,
+        width=min(1.0, max(ba.x + ba.width, bb.x + bb.width)) - x,
+        height=min(1.0, max(ba.y + ba.height, bb.y + bb.height)) - y,
+    )
+    detection = a.detection.model_copy(update={
+        "boundingBox": box,
+        "confidence": max(a.detection.confidence, b.detection.confidence),
+    })
+    return TileDetection(detection, (a.clipped | b.clipped) - set(edges))
+
+
+def merge_tile_detections(
+    items: list[TileDetection], iou_threshold: float
+) -> list[DetectedFurniture]:
+    """
+    Merge detections from overlapping tiles (and the overview) into one list.
+
+    Only detections with the same label are merged. Pieces of one object cut
+    by a tile seam are joined into their union box. Duplicates (high IoU or
+    containment) collapse to one detection, preferring a box that no seam
+    cut off, then the more confident one.
+    """
+    kept: list[TileDetection] = []
+    for item in sorted(items, key=lambda i: i.detection.confidence, reverse=True):
+        label = item.detection.label.lower()
+        for index, existing in enumerate(kept):
+            if existing.detection.label.lower() != label:
+                continue
+            edges = _seam_edges(existing, item)
+            if edges is not None:
+                kept[index] = _join(existing, item, edges)
+                break
+            reverse_edges = _seam_edges(item, existing)
+            if reverse_edges is not None:
+                kept[index] = _join(existing, item, reverse_edges)
+                break
+            if _is_duplicate(existing.detection.boundingBox, item.detection.boundingBox, iou_threshold):
+                if existing.clipped and not item.clipped:
+                    kept[index] = item
+                break
+        else:
+            kept.append(item)
+    return [k.detection for k in kept]
@@ -0,0 +1,101 @@
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+class RequestTiming:
+    """
+    Per-request stage durations, rendered as a Server-Timing header.
+
+    The active instance lives in a ContextVar, so every task spawned by the
+    handler (asyncio.gather, create_task, asyncio.to_thread) records into the
+    same collector without threading it through service signatures.
+    """
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._entries: list[tuple[str, float, Optional[str]]] = []
+
+    def record(self, name: str, seconds: float, desc: Optional[str] = None):
+        """Record a stage duration in seconds."""
+        self._entries.append((name, seconds, desc))
+
+    def elapsed(self) -> float:
+        """Seconds since the request timing started."""
+        return time.perf_counter() - self._start
+
+    def header_value(self) -> str:
+        """Format entries as a Server-Timing header value (durations in ms)."""
+        parts = []
+        for name, seconds, desc in self._entries:
+            part = f"{name};dur={seconds * 1000:.1f}"
+            if desc:
+                # Header values must stay ASCII and must not break the quoting
+                safe_desc = desc.encode("ascii", "ignore").decode().replace('"', "")
+                part += f';desc="{safe_desc}"'
+            parts.append(part)
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def as_dict(self) -> dict[str, float]:
+        """Stage durations in ms keyed by name (repeated names get a desc suffix)."""
+        result: dict[str, float] = {}
+        for name, seconds, desc in self._entries:
+            key = f"{name}:{desc}" if desc else name
+            result[key] = round(result.get(key, 0.0) + seconds * 1000, 1)
+        return result
+
+
+_current_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+def start_request_timing() -> RequestTiming:
+    """Begin collecting stage timings for the current request."""
+    timing = RequestTiming()
+    _current_timing.set(timing)
+    return timing
+
+
+def record_stage(name: str, seconds: float, desc: Optional[str] = None):
+    """Record a stage duration on the active request, if any."""
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.record(name, seconds, desc)
+
+
+class ModelJSONResponse(JSONResponse):
+    """
+    JSON response that serializes Pydantic models with model_dump_json.
+
+    Returning one from an endpoint skips FastAPI's response_model re-validation
+    and jsonable_encoder pass (about 30x slower for a match response, see
+    benchmarks/serialization.py); encoding happens once, in pydantic-core.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.model_dump_json().encode()
+        return super().render(content)
+
+
+def timed_response(
+    payload: BaseModel, timing: RequestTiming, include_debug: bool = False
+) -> ModelJSONResponse:
+    """
+    Serialize a response model and attach a Server-Timing header.
+
+    When include_debug is set, the stage breakdown is also written to the
+    payload's `timings` field. Serialization is timed here, so it only appears
+    in the header.
+    """
+    if include_debug:
+        payload.timings = timing.as_dict()
+
+    start = time.perf_counter()
+    response = ModelJSONResponse(payload)
+    timing.record("serialization", time.perf_counter() - start)
+
+    response.headers["Server-Timing"] = timing.header_value()
+    return response
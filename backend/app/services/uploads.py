@@ -0,0 +1,50 @@
+from typing import BinaryIO
+from PIL import Image as PILImage, UnidentifiedImageError
+from ..config import get_settings
+
+
+# Formats accepted for detection, as reported by Pillow
+ALLOWED_IMAGE_FORMATS = {"JPEG", "PNG", "WEBP"}
+
+
+class InvalidImageError(ValueError):
+    """Raised when an upload is not an acceptable image."""
+
+
+def inspect_image_header(file: BinaryIO) -> tuple[str, int, int]:
+    """
+    Validate an uploaded image from its header only.
+
+    Pillow's open() is lazy: it reads just enough bytes to identify the format
+    and dimensions, so this works on a spooled upload without pulling the full
+    body into memory. Returns (format, width, height) and rewinds the file.
+    """
+    settings = get_settings()
+    try:
+        with PILImage.open(file) as img:
+            image_format = img.format or ""
+            width, height = img.size
+    except PILImage.DecompressionBombError as e:
+        # Pillow's own cap (~179M pixels) trips on the header, before ours below
+        raise InvalidImageError(
+            f"Image resolution too large. Maximum is {settings.max_image_pixels // 1_000_000} megapixels."
+        ) from e
+    except (UnidentifiedImageError, OSError) as e:
+        raise InvalidImageError("Uploaded file is not a readable image.") from e
+    finally:
+        file.seek(0)
+
+    if image_format not in ALLOWED_IMAGE_FORMATS:
+        raise InvalidImageError(
+            f"Unsupported image format {image_format or 'unknown'}. "
+            f"Allowed: {', '.join(sorted(ALLOWED_IMAGE_FORMATS))}"
+        )
+    if min(width, height) < settings.min_image_dimension:
+        raise InvalidImageError(
+            f"Image too small. Minimum dimension is {settings.min_image_dimension}px."
+        )
+    if width * height > settings.max_image_pixels:
+        raise InvalidImageError(
+            f"Image resolution too large. Maximum is {settings.max_image_pixels // 1_000_000} megapixels."
+        )
+    return image_format, width, height
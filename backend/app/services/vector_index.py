@@ -0,0 +1,273 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import re
+import time
+import zlib
+from typing import Optional
+
+import numpy as np
+
+from ..models.product import ProductMatch
+from .metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+STOP_WORDS = {"a", "an", "the", "and", "or", "for", "to", "of", "in", "with", "by", "buy"}
+
+# k-means iterations when (re)training the coarse quantizer
+KMEANS_ITERATIONS = 8
+# Train on at most this many rows (sampled) to bound training time
+KMEANS_MAX_SAMPLE = 20_000
+
+
+def _features(text: str) -> list[tuple[str, float]]:
+    """Word unigrams, plus bigrams at half weight (so "coffee table" isn't just "table")."""
+    words = [w for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in STOP_WORDS]
+    return [(w, 1.0) for w in words] + [(f"{a} {b}", 0.5) for a, b in zip(words, words[1:])]
+
+
+def embed(text: str, dim: int) -> np.ndarray:
+    """
+    Hashing-trick text vector: features hashed (CRC32, stable across runs)
+    into `dim` signed buckets, L2-normalized. Needs no training or vocabulary.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, weight in _features(text):
+        h = zlib.crc32(feature.encode())
+        vector[h % dim] += weight if h & 0x80000000 else -weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def _kmeans(vectors: np.ndarray, k: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids (unit vectors) for a sample of rows."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > KMEANS_MAX_SAMPLE:
+        vectors = vectors[rng.choice(len(vectors), KMEANS_MAX_SAMPLE, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(k):
+            members = vectors[assignment == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                norm = np.linalg.norm(centroid)
+                if norm > 0:
+                    centroids[c] = centroid / norm
+    return centroids
+
+
+class ProductVectorIndex:
+    """
+    Approximate nearest-neighbour index over the products live searches returned.
+
+    Product names are embedded with a hashing vectorizer into a fixed-size
+    float32 matrix (a memory-mapped .npy file when `path` is set, so the
+    index survives restarts) used as a ring buffer of `max_products` rows.
+    Search is IVF: rows are assigned to the nearest of `n_lists` k-means
+    centroids, and a query only scores the rows of its `n_probe` closest
+    lists. Until enough rows exist to train the centroids, every row is
+    scored. Training runs in a worker thread on a snapshot, so it never
+    blocks the event loop. Entries older than `ttl_seconds` (stale prices)
+    are skipped. Only used from the event loop, so no locking.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        max_products: int,
+        n_lists: int,
+        n_probe: int,
+        ttl_seconds: float,
+        path: str = "",
+    ):
+        self.dim = dim
+        self.max_products = max_products
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.ttl = ttl_seconds
+        self.path = path
+
+        self._vectors = self._open_vectors()
+        self._assignment = np.zeros(max_products, dtype=np.int32)
+        self._stored_at = np.zeros(max_products, dtype=np.float64)  # wall clock, persisted
+        self._categories = np.full(max_products, -1, dtype=np.int32)
+        self._category_ids: dict[str, int] = {}
+        self._products: list[Optional[dict]] = [None] * max_products
+        self._rows_by_id: dict[str, int] = {}
+        self._size = 0
+        self._next_row = 0
+
+        self._centroids: Optional[np.ndarray] = None
+        self._trained_size = 0
+        self._training: Optional[asyncio.Task] = None
+        self._written_while_training: set[int] = set()
+
+        self._load_metadata()
+        metrics.set_gauge("product_index_entries", self._size)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def _meta_path(self) -> str:
+        return f"{self.path}.meta.json"
+
+    def _open_vectors(self) -> np.ndarray:
+        shape = (self.max_products, self.dim)
+        if not self.path:
+            return np.zeros(shape, dtype=np.float32)
+        if os.path.exists(self.path):
+            try:
+                vectors = np.load(self.path, mmap_mode="r+")
+                if vectors.shape == shape and vectors.dtype == np.float32:
+                    return vectors
+                logger.warning("Product index at %s has another shape, rebuilding it", self.path)
+            except (OSError, ValueError) as e:
+                logger.warning("Could not open product index %s, rebuilding it: %s", self.path, e)
+        return np.lib.format.open_memmap(self.path, mode="w+", dtype=np.float32, shape=shape)
+
+    def _load_metadata(self):
+        """Restore the rows described by the metadata file saved at shutdown."""
+        if not self.path or not os.path.exists(self._meta_path):
+            return
+        try:
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            if meta.get("dim") != self.dim or meta.get("max_products") != self.max_products:
+                return
+            self._category_ids = meta["categories"]
+            for row, category_id, stored_at, product in meta["rows"]:
+                self._put_row(row, ProductMatch(**product), category_id, stored_at)
+            self._next_row = meta["next_row"] % self.max_products
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Could not read product index metadata: %s", e)
+
+    def metadata(self) -> dict:
+        """Row metadata for save(), taken on the event loop."""
+        return {
+            "dim": self.dim,
+            "max_products": self.max_products,
+            "next_row": self._next_row,
+            "categories": self._category_ids,
+            "rows": [
+                [row, int(self._categories[row]), float(self._stored_at[row]), product]
+                for row, product in enumerate(self._products)
+                if product is not None
+            ],
+        }
+
+    def save(self, meta: dict):
+        """Flush vectors and write the metadata file (blocking; call via asyncio.to_thread)."""
+        if not self.path:
+            return
+        self._vectors.flush()
+        tmp_path = f"{self._meta_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    @staticmethod
+    def _normalize_category(category: str) -> str:
+        return " ".join(category.lower().split())
+
+    def _put_row(self, row: int, product: ProductMatch, category_id: int, stored_at: float):
+        old = self._products[row]
+        if old is not None:
+            self._rows_by_id.pop(old["id"], None)
+        else:
+            self._size += 1
+        self._products[row] = product.model_dump()
+        self._rows_by_id[product.id] = row
+        self._categories[row] = category_id
+        self._stored_at[row] = stored_at
+        if self._centroids is not None:
+            self._assignment[row] = int(np.argmax(self._centroids @ self._vectors[row]))
+        if self._training is not None:
+            self._written_while_training.add(row)
+
+    def add(self, products: list[ProductMatch], category: str):
+        """Index products returned for a category (refreshing ones already held)."""
+        if not products:
+            return
+        key = self._normalize_category(category)
+        category_id = self._category_ids.setdefault(key, len(self._category_ids))
+        now = time.time()
+        for product in products:
+            row = self._rows_by_id.get(product.id)
+            if row is None:
+                row = self._next_row
+                self._next_row = (self._next_row + 1) % self.max_products
+            self._vectors[row] = embed(product.name, self.dim)
+            self._put_row(row, product, category_id, now)
+        metrics.set_gauge("product_index_entries", self._size)
+        self._maybe_train()
+
+    def search(
+        self, query: str, category: str, limit: int, min_score: float, include_stale: bool = False
+    ) -> list[ProductMatch]:
+        """Up to `limit` products of the category whose cosine similarity to the query is >= min_score."""
+        category_id = self._category_ids.get(self._normalize_category(category))
+        if category_id is None or self._size == 0:
+            return []
+
+        with metrics.track("product_index_search"):
+            query_vector = embed(query, self.dim)
+            candidates = self._categories == category_id
+            if self._centroids is not None:
+                probes = np.argsort(self._centroids @ query_vector)[-self.n_probe:]
+                candidates &= np.isin(self._assignment, probes)
+            if not include_stale:
+                candidates &= self._stored_at >= time.time() - self.ttl
+            rows = np.flatnonzero(candidates)
+            if len(rows) == 0:
+                return []
+
+            scores = self._vectors[rows] @ query_vector
+            keep = scores >= min_score
+            rows, scores = rows[keep], scores[keep]
+            best = np.argsort(-scores, kind="stable")[:limit]
+            return [ProductMatch(**self._products[row]) for row in rows[best]]
+
+    def _maybe_train(self):
+        """Retrain the coarse quantizer in the background each time the index doubles."""
+        if self._training is not None or self._size < max(self._trained_size * 2, self.n_lists * 4):
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        rows = np.flatnonzero(self._categories >= 0)
+        sample = np.array(self._vectors[rows])
+        self._training = asyncio.create_task(self._train(sample), context=contextvars.Context())
+
+    async def _train(self, sample: np.ndarray):
+        try:
+            with metrics.track("product_index_train"):
+                centroids = await asyncio.to_thread(_kmeans, sample, self.n_lists)
+                rows = np.flatnonzero(self._categories >= 0)
+                assignment = await asyncio.to_thread(
+                    lambda: np.argmax(self._vectors[rows] @ centroids.T, axis=1)
+                )
+        except Exception as e:
+            logger.exception("Product index training failed, keeping previous lists: %s", e)
+            return
+        finally:
+            self._training = None
+
+        self._centroids = centroids
+        self._assignment[rows] = assignment
+        # Rows (re)written while the assignment ran in the thread
+        for row in self._written_while_training:
+            self._assignment[row] = int(np.argmax(centroids @ self._vectors[row]))
+        self._written_while_training.clear()
+        self._trained_size = len(sample)
+
+
+metrics.describe("product_index_entries", "Products held in the local similar-products index.")
+metrics.describe("product_index_total", "Similar searches answered from the local index, by result (hit/miss).")
@@ -1,15 +1,26 @@
+import logging
 import os
-import io
 import asyncio
 import uuid
 import random
 import base64
 import json
 import tempfile
+from functools import lru_cache
 from typing import Optional
-from PIL import Image as PILImage
 from ..models.detection import DetectedFurniture, BoundingBox
 from ..config import get_settings
+from .metrics import metrics
+from .gemini import GeminiTemplate, get_gemini_client
+from .concurrency import upstream
+from .deadline import has_budget, within_budget
+from .load import SKIP_REFINE, load_controller
+from .image_processing import image_processor
+from .refine_cache import refinement_cache
+from .tiling import TileDetection, image_size, merge_tile_detections, plan_tiles, to_image_coordinates
+
+
+logger = logging.getLogger(__name__)
 
 
 # Furniture categories we can detect
@@ -37,6 +48,188 @@ FURNITURE_CATEGORIES = [
 ]
 
 
+DETECTION_INSTRUCTIONS = (
+    "You are an expert furniture identifier. Analyze the image you are given and identify ALL furniture items visible.\n\n"
+    "For each piece of furniture, provide:\n\n"
+    "1. **label**: Use SPECIFIC furniture subcategories, not generic ones.\n"
+    "   - Instead of 'Sofa': use 'Sectional Sofa', 'Loveseat', 'Chesterfield Sofa', 'Sleeper Sofa', 'Futon'\n"
+    "   - Instead of 'Chair': use 'Dining Chair', 'Office Chair', 'Accent Chair', 'Rocking Chair', 'Lounge Chair'\n"
+    "   - Instead of 'Table': use 'Coffee Table', 'Dining Table', 'Console Table', 'Side Table', 'End Table'\n\n"
+    "2. **brand**: Identify the brand if possible. Look for design signatures:\n"
+    "   - Herman Miller: distinctive ergonomic mesh designs, Eames shell shapes\n"
+    "   - IKEA: flat-pack construction, minimal Scandinavian design\n"
+    "   - West Elm: mid-century modern lines, warm wood tones\n"
+    "   - Restoration Hardware: oversized proportions, weathered finishes\n"
+    "   - Use empty string if you cannot identify the brand.\n\n"
+    "3. **model_name**: The specific model if identifiable. Use empty string if unknown.\n\n"
+    "4. **description**: Detailed search-friendly description. IMPORTANT: Do NOT include brand or model names.\n"
+    "   Include: silhouette, color, material, upholstery type, leg style, hardware, approximate dimensions.\n"
+    "   Example: 'mid-century modern walnut credenza with sliding doors, tapered legs, and brass hardware'\n\n"
+    "5. **color**: Use specific color names ('navy blue' not 'blue', 'charcoal gray' not 'gray')\n\n"
+    "6. **material**: Use specific materials ('walnut wood' not 'wood', 'top-grain leather' not 'leather', "
+    "'performance velvet' not 'fabric')\n\n"
+    "7. **style**: Choose from: modern, mid-century modern, scandinavian, industrial, farmhouse, "
+    "traditional, transitional, art deco, bohemian, coastal, minimalist, contemporary, rustic, glam\n\n"
+    "8. **estimated_price_range**: Estimated retail price range (e.g., '$500-$800')\n\n"
+    "9. **confidence**: How confident you are (0-1)\n\n"
+    "10. **bounding_box**: Normalized coordinates (0-1) — x, y for top-left corner, width and height\n\n"
+    "Only include actual furniture items. Exclude walls, floors, decorations, plants, and electronics."
+)
+
+FOCUSED_INSTRUCTIONS = (
+    "You will be given a close-up photo of a single piece of furniture and its type. "
+    "Analyze it carefully and provide:\n"
+    "- brand: Identify the brand if possible from design signatures, labels, or distinctive features\n"
+    "- model_name: Identify the specific model if possible\n"
+    "- description: Detailed search-friendly description (NO brand/model names). "
+    "Include silhouette, color, material, upholstery, leg style, hardware, approximate size.\n"
+    "- color: Specific color (e.g. 'navy blue' not 'blue')\n"
+    "- material: Specific material (e.g. 'walnut wood' not 'wood')\n"
+    "- style: Design style (modern, mid-century modern, scandinavian, industrial, etc.)\n"
+    "- estimated_price_range: Estimated retail price\n\n"
+    "Be as specific as possible. If you can't identify brand/model, use empty string."
+)
+
+
+def _build_detection_template():
+    """Build the first-pass detection instructions and response schema."""
+    from google.genai import types
+
+    # Define the response schema for structured output
+    furniture_item_schema = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "label": types.Schema(
+                type=types.Type.STRING,
+                description=(
+                    "Specific furniture type. Use precise categories: "
+                    "'Sectional Sofa', 'Loveseat', 'Chesterfield Sofa' (not just 'Sofa'); "
+                    "'Dining Chair', 'Office Chair', 'Accent Chair', 'Rocking Chair' (not just 'Chair'); "
+                    "'Coffee Table', 'Dining Table', 'Console Table', 'Side Table' (not just 'Table')"
+                ),
+            ),
+            "description": types.Schema(
+                type=types.Type.STRING,
+                description=(
+                    "Detailed search-friendly description WITHOUT brand or model names. "
+                    "Include: silhouette shape, color, material, upholstery type, leg style, "
+                    "and distinguishing features. "
+                    "Example: 'mid-century modern walnut wood credenza with sliding doors, "
+                    "tapered legs, and brass hardware, approximately 60 inches wide'"
+                ),
+            ),
+            "color": types.Schema(
+                type=types.Type.STRING,
+                description="Specific color: 'navy blue', 'charcoal gray', 'walnut brown', 'cream white' (not just 'blue' or 'brown')",
+            ),
+            "material": types.Schema(
+                type=types.Type.STRING,
+                description=(
+                    "Specific primary material: 'walnut wood', 'white oak', 'top-grain leather', "
+                    "'performance velvet', 'brushed steel', 'marble' (not just 'wood' or 'fabric')"
+                ),
+            ),
+            "style": types.Schema(
+                type=types.Type.STRING,
+                description=(
+                    "Design style from this list: modern, mid-century modern, scandinavian, "
+                    "industrial, farmhouse, traditional, transitional, art deco, bohemian, "
+                    "coastal, minimalist, contemporary, rustic, glam"
+                ),
+            ),
+            "brand": types.Schema(
+                type=types.Type.STRING,
+                description=(
+                    "Brand name if recognizable. Look for design signatures: "
+                    "Herman Miller (ergonomic mesh, Eames shapes), IKEA (flat-pack, minimal Scandi), "
+                    "West Elm (mid-century lines), Restoration Hardware (oversized, weathered), "
+                    "CB2 (clean modern), Pottery Barn (traditional American), "
+                    "Article (modern minimalist), Crate & Barrel (transitional). "
+                    "Empty string if unknown."
+                ),
+            ),
+            "model_name": types.Schema(
+                type=types.Type.STRING,
+                description="Model name if recognizable, e.g. 'Aeron Chair', 'Kallax', 'Ektorp'. Empty string if unknown.",
+            ),
+            "estimated_price_range": types.Schema(
+                type=types.Type.STRING,
+                description="Estimated retail price range, e.g. '$200-$400', '$1000-$2000'",
+            ),
+            "confidence": types.Schema(
+                type=types.Type.NUMBER,
+                description="Confidence score from 0 to 1",
+            ),
+            "bounding_box": types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "x": types.Schema(type=types.Type.NUMBER, description="Normalized x coordinate (0-1)"),
+                    "y": types.Schema(type=types.Type.NUMBER, description="Normalized y coordinate (0-1)"),
+                    "width": types.Schema(type=types.Type.NUMBER, description="Normalized width (0-1)"),
+                    "height": types.Schema(type=types.Type.NUMBER, description="Normalized height (0-1)"),
+                },
+                required=["x", "y", "width", "height"],
+            ),
+        },
+        required=["label", "description", "color", "material", "style", "brand", "model_name", "estimated_price_range", "confidence", "bounding_box"],
+    )
+
+    response_schema = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "furniture_items": types.Schema(
+                type=types.Type.ARRAY,
+                items=furniture_item_schema,
+            ),
+        },
+        required=["furniture_items"],
+    )
+
+    return DETECTION_INSTRUCTIONS, response_schema
+
+
+def _build_focused_template():
+    """Build the crop-and-reanalyze instructions and response schema."""
+    from google.genai import types
+
+    focused_schema = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "brand": types.Schema(type=types.Type.STRING, description="Brand name if identifiable, empty string if unknown"),
+            "model_name": types.Schema(type=types.Type.STRING, description="Model name if identifiable, empty string if unknown"),
+            "description": types.Schema(type=types.Type.STRING, description="Detailed description without brand/model"),
+            "color": types.Schema(type=types.Type.STRING, description="Specific color name"),
+            "material": types.Schema(type=types.Type.STRING, description="Specific material"),
+            "style": types.Schema(type=types.Type.STRING, description="Design style"),
+            "estimated_price_range": types.Schema(type=types.Type.STRING, description="Estimated price range"),
+        },
+        required=["brand", "model_name", "description", "color", "material", "style", "estimated_price_range"],
+    )
+
+    response_schema = types.Schema(
+        type=types.Type.OBJECT,
+        properties={"item": focused_schema},
+        required=["item"],
+    )
+    return FOCUSED_INSTRUCTIONS, response_schema
+
+
+# Built once and reused for every request (see GeminiTemplate)
+DETECTION_TEMPLATE = GeminiTemplate("detection", _build_detection_template)
+FOCUSED_TEMPLATE = GeminiTemplate("focused", _build_focused_template)
+
+# Cloud Vision labels below this score aren't used to rename objects
+CLOUD_VISION_LABEL_MIN_SCORE = 0.6
+
+
+@lru_cache()
+def get_cloud_vision_client():
+    """Shared async Cloud Vision client (one gRPC channel, reused across requests)."""
+    from google.cloud import vision
+
+    return vision.ImageAnnotatorAsyncClient()
+
+
 class VisionService:
     def __init__(self):
         self.settings = get_settings()
@@ -52,13 +245,26 @@ class VisionService:
                 with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
                     f.write(creds_json)
                     os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = f.name
-                print("Using base64-encoded credentials")
+                logger.info("Using base64-encoded credentials")
             except Exception as e:
-                print(f"Failed to decode base64 credentials: {e}")
+                logger.error("Failed to decode base64 credentials: %s", e)
         # Fall back to file-based credentials
         elif self.settings.google_application_credentials:
             os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = self.settings.google_application_credentials
-            print("Using file-based credentials")
+            logger.info("Using file-based credentials")
+
+    async def warm_up(self):
+        """Prebuild Gemini request templates (and cached context) before serving traffic."""
+        if self.settings.use_mock_detection:
+            return
+        if os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"):
+            # Open the fallback's channel now so a Gemini failure costs one round trip
+            get_cloud_vision_client()
+        if not self.settings.gemini_api_key:
+            return
+        model_name = self._get_gemini_model()
+        await DETECTION_TEMPLATE.warm_up([model_name])
+        await FOCUSED_TEMPLATE.warm_up(sorted(set(self._get_refine_models())))
 
     async def detect_furniture(
         self, image_content: bytes
@@ -168,107 +374,170 @@ class VisionService:
         # Try Gemini first
         if self.settings.gemini_api_key:
             try:
-                detections = await self._gemini_detect(image_content)
+                with metrics.track("gemini_first_pass", timing="first_pass"):
+                    detections = await self._first_pass(image_content)
             except Exception as e:
-                print(f"Gemini detection failed: {e}")
+                logger.warning("Gemini detection failed: %s", e)
 
-        # Fall back to Cloud Vision
+        # Fall back to Cloud Vision (optional: skipped when the deadline is too close)
         if not detections:
+            if not has_budget("cloud_vision_fallback", self.settings.cloud_vision_min_budget_seconds):
+                return detections
+            metrics.inc("detection_fallback_total", to="cloud_vision")
             try:
-                detections = await self._cloud_vision_detect(image_content)
+                with metrics.track("cloud_vision_fallback", timing="cloud_vision_fallback"):
+                    detections = await self._cloud_vision_detect(image_content)
             except Exception as e:
-                print(f"Cloud Vision fallback failed: {e}")
+                logger.warning("Cloud Vision fallback failed: %s", e)
+                metrics.inc("detection_fallback_total", to="mock")
                 return self._mock_detect()
 
         # Second pass: crop-and-reanalyze each detection for better details
-        if detections and self.settings.gemini_api_key:
+        if (
+            detections
+            and self.settings.gemini_api_key
+            and has_budget("refine", self.settings.refine_min_budget_seconds)
+            and not load_controller.sheds(SKIP_REFINE, "refine")
+        ):
             try:
-                detections = await self._refine_detections(image_content, detections)
+                with metrics.track("refine_all"):
+                    detections = await self._refine_detections(image_content, detections)
             except Exception as e:
-                print(f"Crop-and-reanalyze failed, using first-pass results: {e}")
+                logger.warning("Crop-and-reanalyze failed, using first-pass results: %s", e)
 
         return detections
 
-    def _crop_image(self, image_bytes: bytes, bbox: BoundingBox, padding: float = 0.05) -> bytes:
-        """Crop an image region defined by a bounding box with padding."""
-        img = PILImage.open(io.BytesIO(image_bytes))
-        w, h = img.size
-
-        # Calculate crop coordinates with padding
-        left = max(0, int((bbox.x - padding) * w))
-        top = max(0, int((bbox.y - padding) * h))
-        right = min(w, int((bbox.x + bbox.width + padding) * w))
-        bottom = min(h, int((bbox.y + bbox.height + padding) * h))
+    async def _first_pass(self, image_content: bytes) -> list[DetectedFurniture]:
+        """Gemini detection on the whole image, or on tiles when tiling applies."""
+        if self.settings.tiled_detection:
+            try:
+                width, height = image_size(image_content)
+            except Exception:
+                width = height = 0
+            tiles = plan_tiles(
+                width,
+                height,
+                target_size=self.settings.tile_target_size,
+                overlap=self.settings.tile_overlap,
+                max_tiles=self.settings.tile_max_tiles,
+                min_pixels=self.settings.tile_min_pixels,
+            )
+            if tiles:
+                return await self._tiled_detect(image_content, tiles)
+        return await self._gemini_detect(image_content)
 
-        cropped = img.crop((left, top, right, bottom))
-        buf = io.BytesIO()
-        cropped.save(buf, format="JPEG", quality=90)
-        return buf.getvalue()
+    async def _tiled_detect(self, image_content: bytes, tiles: list) -> list[DetectedFurniture]:
+        """
+        Detect on overlapping tiles concurrently and merge across the seams.
 
-    async def _focused_detect(self, cropped_bytes: bytes, label: str) -> dict:
-        """Second-pass Gemini call on a cropped image for detailed identification."""
-        from google import genai
-        from google.genai import types
+        A downscaled overview of the whole image is detected at the same time
+        so objects larger than a tile still come back in one piece. Failed
+        tiles are dropped; only if every call fails does the error propagate.
+        """
+        metrics.inc("tiled_detection_total")
 
-        client = genai.Client(api_key=self.settings.gemini_api_key)
-
-        focused_schema = types.Schema(
-            type=types.Type.OBJECT,
-            properties={
-                "brand": types.Schema(type=types.Type.STRING, description="Brand name if identifiable, empty string if unknown"),
-                "model_name": types.Schema(type=types.Type.STRING, description="Model name if identifiable, empty string if unknown"),
-                "description": types.Schema(type=types.Type.STRING, description="Detailed description without brand/model"),
-                "color": types.Schema(type=types.Type.STRING, description="Specific color name"),
-                "material": types.Schema(type=types.Type.STRING, description="Specific material"),
-                "style": types.Schema(type=types.Type.STRING, description="Design style"),
-                "estimated_price_range": types.Schema(type=types.Type.STRING, description="Estimated price range"),
-            },
-            required=["brand", "model_name", "description", "color", "material", "style", "estimated_price_range"],
-        )
+        async def detect_tile(tile, tile_bytes: bytes) -> list[TileDetection]:
+            with metrics.track("gemini_tile"):
+                detections = await self._gemini_detect(tile_bytes)
+            return [to_image_coordinates(d, tile) for d in detections]
 
-        response_schema = types.Schema(
-            type=types.Type.OBJECT,
-            properties={"item": types.Schema(type=types.Type.OBJECT, properties=focused_schema.properties, required=focused_schema.required)},
-            required=["item"],
+        async def detect_overview() -> list[TileDetection]:
+            overview = await image_processor.thumbnail(
+                image_content, self.settings.tile_target_size, quality=90
+            )
+            with metrics.track("gemini_tile"):
+                detections = await self._gemini_detect(overview)
+            return [TileDetection(d) for d in detections]
+
+        tile_images = await image_processor.crops(image_content, [t.box() for t in tiles])
+        results = await asyncio.gather(
+            detect_overview(),
+            *[detect_tile(tile, data) for tile, data in zip(tiles, tile_images)],
+            return_exceptions=True,
         )
 
-        prompt = (
-            f"This is a close-up photo of a {label}. Analyze it carefully and provide:\n"
-            "- brand: Identify the brand if possible from design signatures, labels, or distinctive features\n"
-            "- model_name: Identify the specific model if possible\n"
-            "- description: Detailed search-friendly description (NO brand/model names). "
-            "Include silhouette, color, material, upholstery, leg style, hardware, approximate size.\n"
-            "- color: Specific color (e.g. 'navy blue' not 'blue')\n"
-            "- material: Specific material (e.g. 'walnut wood' not 'wood')\n"
-            "- style: Design style (modern, mid-century modern, scandinavian, industrial, etc.)\n"
-            "- estimated_price_range: Estimated retail price\n\n"
-            "Be as specific as possible. If you can't identify brand/model, use empty string."
-        )
+        merged_input: list[TileDetection] = []
+        errors = []
+        for result in results:
+            if isinstance(result, BaseException):
+                errors.append(result)
+            else:
+                merged_input.extend(result)
+        if len(errors) == len(results):
+            raise errors[0]
+        if errors:
+            logger.warning("Tiled detection: %d of %d calls failed: %s", len(errors), len(results), errors[0])
+
+        return merge_tile_detections(merged_input, self.settings.tile_merge_iou)
+
+    async def _focused_detect(self, cropped_bytes: bytes, label: str, model_name: str) -> dict:
+        """Second-pass Gemini call on a cropped image for detailed identification."""
+        from google.genai import types
 
         image_part = types.Part.from_bytes(data=cropped_bytes, mime_type="image/jpeg")
-        model_name = self._get_gemini_model()
 
-        response = client.models.generate_content(
-            model=model_name,
-            contents=[image_part, prompt],
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                response_schema=response_schema,
-            ),
-        )
+        async with upstream("gemini").slot():
+            response = await within_budget(get_gemini_client().aio.models.generate_content(
+                model=model_name,
+                contents=[image_part, f"This is a close-up photo of a {label}."],
+                config=await FOCUSED_TEMPLATE.config_for(model_name),
+            ))
 
         result = json.loads(response.text)
         return result.get("item", {})
 
+    async def _cached_focused_detect(
+        self, cropped_bytes: bytes, label: str, model_name: str, reason: str
+    ) -> dict:
+        """Focused detection, reusing the result for a near-identical earlier crop."""
+        fingerprint = None
+        if self.settings.refine_cache_enabled:
+            try:
+                fingerprint = await image_processor.dhash(cropped_bytes)
+                width, height = image_size(cropped_bytes)
+                aspect_ratio = width / height
+            except Exception as e:
+                fingerprint = None
+                logger.warning("Crop hashing failed, skipping refinement cache: %s", e)
+            else:
+                cached = refinement_cache.get(label, model_name, fingerprint, aspect_ratio)
+                if cached is not None:
+                    return cached
+
+        metrics.inc(
+            "gemini_route_total", stage="refine", route=self._route_name(model_name), reason=reason
+        )
+        refined = await self._focused_detect(cropped_bytes, label, model_name)
+        if fingerprint is not None:
+            refinement_cache.put(label, model_name, fingerprint, aspect_ratio, refined)
+        return refined
+
     async def _refine_detections(
         self, image_bytes: bytes, detections: list[DetectedFurniture]
     ) -> list[DetectedFurniture]:
         """Crop each detection and run a focused second-pass for better details."""
+        try:
+            # One decode for every crop (off the event loop)
+            crops = await image_processor.crops(
+                image_bytes, [d.boundingBox.model_dump() for d in detections], padding=0.05
+            )
+        except Exception as e:
+            logger.warning("Cropping detections for refinement failed: %s", e)
+            return detections
 
-        async def refine_one(detection: DetectedFurniture) -> DetectedFurniture:
+        async def refine_one(detection: DetectedFurniture, cropped: bytes) -> DetectedFurniture:
+            model_name, reason = self._route_refinement(detection)
+            route = self._route_name(model_name)
             try:
-                cropped = self._crop_image(image_bytes, detection.boundingBox)
-                refined = await self._focused_detect(cropped, detection.label)
+                with metrics.track(
+                    "refine",
+                    timing=f"refine_{detection.id}",
+                    timing_desc=f"{detection.label} ({route})",
+                    route=route,
+                ):
+                    refined = await self._cached_focused_detect(
+                        cropped, detection.label, model_name, reason
+                    )
 
                 # Only overwrite fields where the second pass found better info
                 new_brand = (refined.get("brand", "") or None) or detection.brand
@@ -280,25 +549,23 @@ class VisionService:
                 elif new_brand and not detection.identified_product:
                     new_identified = new_brand
 
-                return DetectedFurniture(
-                    id=detection.id,
-                    label=detection.label,
-                    confidence=detection.confidence,
-                    boundingBox=detection.boundingBox,
-                    description=refined.get("description") or detection.description,
-                    color=refined.get("color") or detection.color,
-                    material=refined.get("material") or detection.material,
-                    style=refined.get("style") or detection.style,
-                    brand=new_brand,
-                    model_name=new_model,
-                    identified_product=new_identified,
-                    estimated_price_range=refined.get("estimated_price_range") or detection.estimated_price_range,
-                )
+                # The first-pass detection is already validated; copy it with
+                # the refined fields rather than rebuilding it field by field
+                return detection.model_copy(update={
+                    "description": refined.get("description") or detection.description,
+                    "color": refined.get("color") or detection.color,
+                    "material": refined.get("material") or detection.material,
+                    "style": refined.get("style") or detection.style,
+                    "brand": new_brand,
+                    "model_name": new_model,
+                    "identified_product": new_identified,
+                    "estimated_price_range": refined.get("estimated_price_range") or detection.estimated_price_range,
+                })
             except Exception as e:
-                print(f"Refinement failed for {detection.label}: {e}")
+                logger.warning("Refinement failed for %s: %s", detection.label, e)
                 return detection
 
-        refined = await asyncio.gather(*[refine_one(d) for d in detections])
+        refined = await asyncio.gather(*[refine_one(d, c) for d, c in zip(detections, crops)])
         return list(refined)
 
     def _get_gemini_model(self) -> str:
@@ -307,147 +574,50 @@ class VisionService:
             return self.settings.gemini_pro_model
         return self.settings.gemini_model
 
+    def _get_refine_models(self) -> tuple[str, str]:
+        """(default, escalation) models for the refine pass."""
+        default = self._get_gemini_model()
+        if self.settings.gemini_routing and not self.settings.use_gemini_pro:
+            return default, self.settings.gemini_pro_model
+        return default, default
+
+    def _route_refinement(self, detection: DetectedFurniture) -> tuple[str, str]:
+        """
+        Pick the refine model for one detection and say why.
+
+        Confident, fully identified detections stay on the default (flash)
+        model; low-confidence or unidentified ones escalate to pro.
+        """
+        default, escalation = self._get_refine_models()
+        if detection.confidence < self.settings.gemini_escalation_confidence:
+            return escalation, "low_confidence"
+        if not detection.brand or not detection.model_name:
+            return escalation, "unidentified"
+        return default, "confident"
+
+    def _route_name(self, model_name: str) -> str:
+        """Metric label for a model: "pro" or "flash"."""
+        return "pro" if model_name == self.settings.gemini_pro_model else "flash"
+
     async def _gemini_detect(
         self, image_content: bytes
     ) -> list[DetectedFurniture]:
         """Use Gemini for semantic furniture detection with structured output."""
-        from google import genai
         from google.genai import types
 
-        client = genai.Client(api_key=self.settings.gemini_api_key)
-
-        # Define the response schema for structured output
-        furniture_item_schema = types.Schema(
-            type=types.Type.OBJECT,
-            properties={
-                "label": types.Schema(
-                    type=types.Type.STRING,
-                    description=(
-                        "Specific furniture type. Use precise categories: "
-                        "'Sectional Sofa', 'Loveseat', 'Chesterfield Sofa' (not just 'Sofa'); "
-                        "'Dining Chair', 'Office Chair', 'Accent Chair', 'Rocking Chair' (not just 'Chair'); "
-                        "'Coffee Table', 'Dining Table', 'Console Table', 'Side Table' (not just 'Table')"
-                    ),
-                ),
-                "description": types.Schema(
-                    type=types.Type.STRING,
-                    description=(
-                        "Detailed search-friendly description WITHOUT brand or model names. "
-                        "Include: silhouette shape, color, material, upholstery type, leg style, "
-                        "and distinguishing features. "
-                        "Example: 'mid-century modern walnut wood credenza with sliding doors, "
-                        "tapered legs, and brass hardware, approximately 60 inches wide'"
-                    ),
-                ),
-                "color": types.Schema(
-                    type=types.Type.STRING,
-                    description="Specific color: 'navy blue', 'charcoal gray', 'walnut brown', 'cream white' (not just 'blue' or 'brown')",
-                ),
-                "material": types.Schema(
-                    type=types.Type.STRING,
-                    description=(
-                        "Specific primary material: 'walnut wood', 'white oak', 'top-grain leather', "
-                        "'performance velvet', 'brushed steel', 'marble' (not just 'wood' or 'fabric')"
-                    ),
-                ),
-                "style": types.Schema(
-                    type=types.Type.STRING,
-                    description=(
-                        "Design style from this list: modern, mid-century modern, scandinavian, "
-                        "industrial, farmhouse, traditional, transitional, art deco, bohemian, "
-                        "coastal, minimalist, contemporary, rustic, glam"
-                    ),
-                ),
-                "brand": types.Schema(
-                    type=types.Type.STRING,
-                    description=(
-                        "Brand name if recognizable. Look for design signatures: "
-                        "Herman Miller (ergonomic mesh, Eames shapes), IKEA (flat-pack, minimal Scandi), "
-                        "West Elm (mid-century lines), Restoration Hardware (oversized, weathered), "
-                        "CB2 (clean modern), Pottery Barn (traditional American), "
-                        "Article (modern minimalist), Crate & Barrel (transitional). "
-                        "Empty string if unknown."
-                    ),
-                ),
-                "model_name": types.Schema(
-                    type=types.Type.STRING,
-                    description="Model name if recognizable, e.g. 'Aeron Chair', 'Kallax', 'Ektorp'. Empty string if unknown.",
-                ),
-                "estimated_price_range": types.Schema(
-                    type=types.Type.STRING,
-                    description="Estimated retail price range, e.g. '$200-$400', '$1000-$2000'",
-                ),
-                "confidence": types.Schema(
-                    type=types.Type.NUMBER,
-                    description="Confidence score from 0 to 1",
-                ),
-                "bounding_box": types.Schema(
-                    type=types.Type.OBJECT,
-                    properties={
-                        "x": types.Schema(type=types.Type.NUMBER, description="Normalized x coordinate (0-1)"),
-                        "y": types.Schema(type=types.Type.NUMBER, description="Normalized y coordinate (0-1)"),
-                        "width": types.Schema(type=types.Type.NUMBER, description="Normalized width (0-1)"),
-                        "height": types.Schema(type=types.Type.NUMBER, description="Normalized height (0-1)"),
-                    },
-                    required=["x", "y", "width", "height"],
-                ),
-            },
-            required=["label", "description", "color", "material", "style", "brand", "model_name", "estimated_price_range", "confidence", "bounding_box"],
-        )
-
-        response_schema = types.Schema(
-            type=types.Type.OBJECT,
-            properties={
-                "furniture_items": types.Schema(
-                    type=types.Type.ARRAY,
-                    items=furniture_item_schema,
-                ),
-            },
-            required=["furniture_items"],
-        )
-
-        prompt = (
-            "You are an expert furniture identifier. Analyze this image and identify ALL furniture items visible.\n\n"
-            "For each piece of furniture, provide:\n\n"
-            "1. **label**: Use SPECIFIC furniture subcategories, not generic ones.\n"
-            "   - Instead of 'Sofa': use 'Sectional Sofa', 'Loveseat', 'Chesterfield Sofa', 'Sleeper Sofa', 'Futon'\n"
-            "   - Instead of 'Chair': use 'Dining Chair', 'Office Chair', 'Accent Chair', 'Rocking Chair', 'Lounge Chair'\n"
-            "   - Instead of 'Table': use 'Coffee Table', 'Dining Table', 'Console Table', 'Side Table', 'End Table'\n\n"
-            "2. **brand**: Identify the brand if possible. Look for design signatures:\n"
-            "   - Herman Miller: distinctive ergonomic mesh designs, Eames shell shapes\n"
-            "   - IKEA: flat-pack construction, minimal Scandinavian design\n"
-            "   - West Elm: mid-century modern lines, warm wood tones\n"
-            "   - Restoration Hardware: oversized proportions, weathered finishes\n"
-            "   - Use empty string if you cannot identify the brand.\n\n"
-            "3. **model_name**: The specific model if identifiable. Use empty string if unknown.\n\n"
-            "4. **description**: Detailed search-friendly description. IMPORTANT: Do NOT include brand or model names.\n"
-            "   Include: silhouette, color, material, upholstery type, leg style, hardware, approximate dimensions.\n"
-            "   Example: 'mid-century modern walnut credenza with sliding doors, tapered legs, and brass hardware'\n\n"
-            "5. **color**: Use specific color names ('navy blue' not 'blue', 'charcoal gray' not 'gray')\n\n"
-            "6. **material**: Use specific materials ('walnut wood' not 'wood', 'top-grain leather' not 'leather', "
-            "'performance velvet' not 'fabric')\n\n"
-            "7. **style**: Choose from: modern, mid-century modern, scandinavian, industrial, farmhouse, "
-            "traditional, transitional, art deco, bohemian, coastal, minimalist, contemporary, rustic, glam\n\n"
-            "8. **estimated_price_range**: Estimated retail price range (e.g., '$500-$800')\n\n"
-            "9. **confidence**: How confident you are (0-1)\n\n"
-            "10. **bounding_box**: Normalized coordinates (0-1) — x, y for top-left corner, width and height\n\n"
-            "Only include actual furniture items. Exclude walls, floors, decorations, plants, and electronics."
-        )
-
         image_part = types.Part.from_bytes(
             data=image_content,
             mime_type="image/jpeg",
         )
 
         model_name = self._get_gemini_model()
-        response = client.models.generate_content(
-            model=model_name,
-            contents=[image_part, prompt],
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                response_schema=response_schema,
-            ),
-        )
+        metrics.inc("gemini_route_total", stage="first_pass", route=self._route_name(model_name), reason="default")
+        async with upstream("gemini").slot():
+            response = await within_budget(get_gemini_client().aio.models.generate_content(
+                model=model_name,
+                contents=[image_part, "Identify all furniture in this photo."],
+                config=await DETECTION_TEMPLATE.config_for(model_name),
+            ))
 
         result = json.loads(response.text)
         furniture_items = result.get("furniture_items", [])
@@ -496,40 +666,78 @@ class VisionService:
         """
         Use Google Cloud Vision API as a fallback detector.
         Requires GOOGLE_APPLICATION_CREDENTIALS env variable.
+
+        Object localization (boxes) and label detection (more specific names)
+        go out as one batch_annotate_images request on the shared async client.
         """
         from google.cloud import vision
 
-        client = vision.ImageAnnotatorClient()
-        image = vision.Image(content=image_content)
-
-        # Use object localization for bounding boxes
-        response = client.object_localization(image=image)
-        objects = response.localized_object_annotations
+        request = vision.AnnotateImageRequest(
+            image=vision.Image(content=image_content),
+            features=[
+                vision.Feature(type_=vision.Feature.Type.OBJECT_LOCALIZATION),
+                vision.Feature(type_=vision.Feature.Type.LABEL_DETECTION),
+            ],
+        )
+        async with upstream("cloud_vision").slot():
+            batch = await within_budget(
+                get_cloud_vision_client().batch_annotate_images(requests=[request])
+            )
+        response = batch.responses[0]
+        if response.error.message:
+            raise RuntimeError(f"Cloud Vision error: {response.error.message}")
+
+        objects = [obj for obj in response.localized_object_annotations if self._is_furniture(obj.name)]
+        labels = [
+            label.description
+            for label in response.label_annotations
+            if label.score >= CLOUD_VISION_LABEL_MIN_SCORE
+        ]
+        generic_count = sum(1 for obj in objects if obj.name.lower() == "furniture")
 
         detections = []
         for obj in objects:
-            # Filter for furniture-related objects
-            if self._is_furniture(obj.name):
-                vertices = obj.bounding_poly.normalized_vertices
-                if len(vertices) >= 4:
-                    x_coords = [v.x for v in vertices]
-                    y_coords = [v.y for v in vertices]
-
-                    detection = DetectedFurniture(
-                        id=str(uuid.uuid4())[:8],
-                        label=self._normalize_label(obj.name),
-                        confidence=obj.score,
-                        boundingBox=BoundingBox(
-                            x=min(x_coords),
-                            y=min(y_coords),
-                            width=max(x_coords) - min(x_coords),
-                            height=max(y_coords) - min(y_coords),
-                        ),
-                    )
-                    detections.append(detection)
+            vertices = obj.bounding_poly.normalized_vertices
+            if len(vertices) >= 4:
+                x_coords = [v.x for v in vertices]
+                y_coords = [v.y for v in vertices]
+                name = self._specific_object_name(obj.name, labels, generic_count == 1)
+
+                detection = DetectedFurniture(
+                    id=str(uuid.uuid4())[:8],
+                    label=self._normalize_label(name),
+                    confidence=obj.score,
+                    boundingBox=BoundingBox(
+                        x=min(x_coords),
+                        y=min(y_coords),
+                        width=max(x_coords) - min(x_coords),
+                        height=max(y_coords) - min(y_coords),
+                    ),
+                )
+                detections.append(detection)
 
         return detections
 
+    def _specific_object_name(self, name: str, labels: list[str], allow_generic: bool) -> str:
+        """
+        Use an image label to make a generic object name more specific.
+
+        Object localization often says "Table" or "Furniture" where label
+        detection says "Coffee table" or "Couch". A label is used when it
+        extends the object name ("Table" -> "Coffee table"), or for a lone
+        "Furniture" object when it is any furniture label. Labels are in
+        score order, so the best match wins.
+        """
+        name_lower = name.lower()
+        generic = name_lower == "furniture"
+        for label in labels:
+            label_lower = label.lower()
+            if label_lower == name_lower or not self._is_furniture(label_lower):
+                continue
+            if name_lower in label_lower.split() or (generic and allow_generic):
+                return label
+        return name
+
     def _is_furniture(self, label: str) -> bool:
         """Check if a label is furniture-related."""
         furniture_keywords = [
@@ -0,0 +1,59 @@
+"""
+Mock-mode product search at catalog scale.
+
+Generates synthetic catalogs of increasing size and reports build time,
+column memory, peak RSS and per-search latency for a mix of queries
+(broad category, attribute-heavy, brand, unknown category).
+
+Run from backend/:
+    python -m benchmarks.catalog [size ...]      # default: 100000 1000000
+"""
+
+import resource
+import statistics
+import sys
+import time
+
+from app.services.catalog_store import build_catalog_store
+
+QUERIES = [
+    ("sofa furniture", "sofa"),
+    ("Mid-century modern walnut chair in brown leather", "chair"),
+    ("Herman Miller office chair black", "office chair"),
+    ("scandinavian oak dining table natural", "dining table"),
+    ("velvet green accent chair glam", "accent chair"),
+    ("industrial metal bookshelf", "bookshelf"),
+    ("bean bag", "bean bag"),
+]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(sizes: list[int]):
+    print(f"{'products':>12} {'build s':>8} {'columns MB':>11} {'peak RSS MB':>12} {'p50 ms':>8} {'p95 ms':>8}")
+    for size in sizes:
+        start = time.perf_counter()
+        store = build_catalog_store(size, seed=0)
+        build_seconds = time.perf_counter() - start
+
+        latencies = []
+        for _ in range(20):
+            for query, category in QUERIES:
+                start = time.perf_counter()
+                store.search(query, category, 6)
+                latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+
+        print(
+            f"{size:>12,} {build_seconds:>8.2f} {store.nbytes / 1e6:>11.1f} {_peak_rss_mb():>12.0f}"
+            f" {statistics.median(latencies):>8.2f} {p95:>8.2f}"
+        )
+        del store
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,116 @@
+"""
+Per-response serialization and model construction costs.
+
+Compares FastAPI's default path for a returned model (response_model
+validation + jsonable_encoder + json.dumps) with the ModelJSONResponse path
+the detect/match routers use, plus orjson over model_dump() when orjson is
+installed. Also times the ways a refined detection can be built.
+
+Run from backend/:
+    python -m benchmarks.serialization
+"""
+
+import json
+import time
+from typing import Callable
+
+from fastapi.encoders import jsonable_encoder
+
+from app.models import (
+    BoundingBox,
+    DetectedFurniture,
+    DetectionResponse,
+    ProductMatch,
+    ProductMatchResponse,
+)
+from app.services.timing import ModelJSONResponse
+
+
+def _bench(fn: Callable[[], object], iterations: int) -> float:
+    """Mean microseconds per call."""
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def _product(i: int) -> ProductMatch:
+    return ProductMatch(
+        id=f"{i:012x}",
+        name=f"Mid-Century Modern Walnut Lounge Chair {i}",
+        price=299.99 + i,
+        imageUrl=f"https://images.example.com/products/{i}.jpg",
+        productUrl=f"https://www.example.com/products/{i}",
+        retailer="Wayfair",
+        similarity=0.5 + i / 100,
+    )
+
+
+def _detection(i: int) -> DetectedFurniture:
+    return DetectedFurniture(
+        id=f"{i:08x}",
+        label="Chair",
+        confidence=0.9,
+        boundingBox=BoundingBox(x=0.1, y=0.2, width=0.3, height=0.4),
+        description="Walnut lounge chair with black leather cushions",
+        color="brown",
+        material="wood",
+        style="mid-century modern",
+    )
+
+
+def _fastapi_default(model, response_model):
+    """What FastAPI does for an endpoint that returns a model."""
+    validated = response_model.model_validate(model.model_dump())
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def main():
+    products = [_product(i) for i in range(12)]
+    match_response = ProductMatchResponse(
+        success=True,
+        products=products,
+        exact_products=products[:6],
+        similar_products=products[6:],
+        category="chair",
+    )
+    detect_response = DetectionResponse(
+        success=True, detections=[_detection(i) for i in range(8)], session_id="s", image_hash="0" * 64
+    )
+
+    print("Serialization per response (us)")
+    for name, payload, model in (
+        ("match", match_response, ProductMatchResponse),
+        ("detect", detect_response, DetectionResponse),
+    ):
+        rows = {
+            "fastapi default": _bench(lambda: _fastapi_default(payload, model), 2_000),
+            "ModelJSONResponse": _bench(lambda: ModelJSONResponse(payload), 20_000),
+        }
+        try:
+            import orjson
+
+            rows["orjson(model_dump)"] = _bench(lambda: orjson.dumps(payload.model_dump()), 20_000)
+        except ImportError:
+            pass
+        for label, micros in rows.items():
+            print(f"  {name:7s} {label:20s} {micros:9.1f}")
+
+    detection = _detection(0)
+    fields = detection.model_dump()
+    fields["boundingBox"] = detection.boundingBox
+    update = {"description": "Refined description", "brand": "Herman Miller", "model_name": "Eames"}
+
+    print("Refined detection construction (us)")
+    rows = {
+        "validated rebuild": _bench(lambda: DetectedFurniture(**{**fields, **update}), 50_000),
+        "model_construct": _bench(lambda: DetectedFurniture.model_construct(**{**fields, **update}), 50_000),
+        "model_copy(update)": _bench(lambda: detection.model_copy(update=update), 50_000),
+    }
+    for label, micros in rows.items():
+        print(f"  {label:28s} {micros:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ import CaptureButton from './CaptureButton';
 import { colors, typography, fontFamily, borderRadius, spacing, shadows } from '../theme';
 
 interface CameraViewProps {
-  onCapture: (uri: string) => void;
+  onCapture: (uri: string, base64?: string) => void;
   onGalleryPress: () => void;
 }
 
@@ -56,9 +56,10 @@ export default function CameraView({ onCapture, onGalleryPress }: CameraViewProp
     try {
       const photo = await cameraRef.current.takePictureAsync({
         quality: 0.8,
+        base64: true,
       });
       if (photo?.uri) {
-        onCapture(photo.uri);
+        onCapture(photo.uri, photo.base64);
       }
     } catch (error) {
       console.error('Failed to capture photo:', error);
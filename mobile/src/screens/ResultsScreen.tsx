@@ -29,6 +29,8 @@ export default function ResultsScreen() {
   const { imageUri } = route.params;
 
   const {
+    currentImage,
+    currentImageBase64,
     detectedFurniture,
     setDetectedFurniture,
     selectedFurniture,
@@ -69,7 +71,8 @@ export default function ResultsScreen() {
       setError(null);
 
       try {
-        const { detections: results, sessionId: sid } = await detectFurniture(imageUri);
+        const base64 = currentImage === imageUri ? currentImageBase64 : null;
+        const { detections: results, sessionId: sid } = await detectFurniture(imageUri, base64);
         setDetectedFurniture(results);
         setSessionId(sid);
 
@@ -108,6 +111,7 @@ export default function ResultsScreen() {
           try {
             result = await getProductMatchesVisual({
               sessionId,
+              detectionId: furniture.id,
               boundingBox: furniture.boundingBox,
               category: furniture.label,
               description: furniture.description,
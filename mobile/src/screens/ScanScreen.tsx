@@ -31,7 +31,7 @@ export default function ScanScreen() {
   const [showAuthModal, setShowAuthModal] = useState(false);
   const [showPaywallModal, setShowPaywallModal] = useState(false);
   const [showSoftPrompt, setShowSoftPrompt] = useState(false);
-  const [pendingImageUri, setPendingImageUri] = useState<string | null>(null);
+  const [pendingImage, setPendingImage] = useState<{ uri: string; base64?: string } | null>(null);
 
   // Check if we should show soft prompt when screen focuses
   useFocusEffect(
@@ -64,8 +64,8 @@ export default function ScanScreen() {
     return true;
   };
 
-  const processScan = (uri: string) => {
-    setCurrentImage(uri);
+  const processScan = (uri: string, base64?: string) => {
+    setCurrentImage(uri, base64);
     if (!isPro) {
       decrementScans();
     }
@@ -78,17 +78,17 @@ export default function ScanScreen() {
     }
   };
 
-  const handleCapture = (uri: string) => {
+  const handleCapture = (uri: string, base64?: string) => {
     if (!checkAuthGate()) {
-      setPendingImageUri(uri);
+      setPendingImage({ uri, base64 });
       return;
     }
     if (!checkScanLimit()) {
-      setPendingImageUri(uri);
+      setPendingImage({ uri, base64 });
       return;
     }
 
-    processScan(uri);
+    processScan(uri, base64);
   };
 
   const handleGalleryPress = async () => {
@@ -100,21 +100,22 @@ export default function ScanScreen() {
       allowsEditing: true,
       aspect: [4, 3],
       quality: 0.8,
+      base64: true,
     });
 
     if (!result.canceled && result.assets[0]) {
-      processScan(result.assets[0].uri);
+      processScan(result.assets[0].uri, result.assets[0].base64 ?? undefined);
     }
   };
 
   const handleAuthModalClose = () => {
     setShowAuthModal(false);
     // If user authenticated and has pending image, process it
-    if (isAuthenticated && pendingImageUri) {
+    if (isAuthenticated && pendingImage) {
       if (checkScanLimit()) {
-        processScan(pendingImageUri);
+        processScan(pendingImage.uri, pendingImage.base64);
       }
-      setPendingImageUri(null);
+      setPendingImage(null);
     }
   };
 
@@ -131,7 +132,7 @@ export default function ScanScreen() {
 
   const handlePaywallClose = () => {
     setShowPaywallModal(false);
-    setPendingImageUri(null);
+    setPendingImage(null);
   };
 
   // Display logic for scan counter
@@ -1,3 +1,4 @@
+import * as Crypto from 'expo-crypto';
 import { apiClient } from './api';
 import { DetectedFurniture, ProductMatch } from '../navigation/types';
 
@@ -6,6 +7,13 @@ interface DetectionResponse {
   session_id: string | null;
 }
 
+interface ImageLookupResponse {
+  found: boolean;
+  image_hash: string;
+  session_id: string | null;
+  detections: DetectedFurniture[];
+}
+
 export interface DetectionResult {
   detections: DetectedFurniture[];
   sessionId: string | null;
@@ -24,7 +32,49 @@ export interface ProductMatchResult {
   identifiedProduct: string | null;
 }
 
-export async function detectFurniture(imageUri: string): Promise<DetectionResult> {
+// Lowercase hex SHA-256 of the image bytes, as the server computes it
+async function hashImage(base64: string): Promise<string> {
+  const binary = atob(base64.replace(/\s/g, ''));
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  const digest = await Crypto.digest(Crypto.CryptoDigestAlgorithm.SHA256, bytes);
+  return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, '0')).join('');
+}
+
+// Results the server already holds for this image, or null if it must be uploaded
+async function lookupImage(base64: string): Promise<DetectionResult | null> {
+  try {
+    const imageHash = await hashImage(base64);
+    const response = await apiClient.post<ImageLookupResponse>('/api/detect/lookup', {
+      image_hash: imageHash,
+    });
+    if (!response.data?.found) {
+      return null;
+    }
+    return {
+      detections: response.data.detections || [],
+      sessionId: response.data.session_id || null,
+    };
+  } catch (error) {
+    console.error('Image lookup failed:', error);
+    return null;
+  }
+}
+
+export async function detectFurniture(
+  imageUri: string,
+  imageBase64?: string | null,
+): Promise<DetectionResult> {
+  // Upload-once: skip sending the photo if the server already has it (e.g. a rescan)
+  if (imageBase64) {
+    const cached = await lookupImage(imageBase64);
+    if (cached) {
+      return cached;
+    }
+  }
+
   const formData = new FormData();
 
   const filename = imageUri.split('/').pop() || 'photo.jpg';
@@ -97,6 +147,7 @@ export async function getProductMatches(
 
 export interface VisualMatchParams {
   sessionId: string;
+  detectionId?: string;
   boundingBox: { x: number; y: number; width: number; height: number };
   category: string;
   description?: string;
@@ -114,6 +165,7 @@ export async function getProductMatchesVisual(
 ): Promise<ProductMatchResult> {
   const body = {
     session_id: params.sessionId,
+    detection_id: params.detectionId,
     bounding_box: params.boundingBox,
     category: params.category,
     description: params.description,
@@ -3,6 +3,7 @@ import { DetectedFurniture, ProductMatch } from '../navigation/types';
 
 interface ScanState {
   currentImage: string | null;
+  currentImageBase64: string | null;
   detectedFurniture: DetectedFurniture[];
   selectedFurniture: DetectedFurniture | null;
   productMatches: ProductMatch[];
@@ -13,7 +14,7 @@ interface ScanState {
   isLoading: boolean;
   error: string | null;
 
-  setCurrentImage: (uri: string | null) => void;
+  setCurrentImage: (uri: string | null, base64?: string | null) => void;
   setDetectedFurniture: (furniture: DetectedFurniture[]) => void;
   setSelectedFurniture: (furniture: DetectedFurniture | null) => void;
   setProductMatches: (products: ProductMatch[]) => void;
@@ -30,6 +31,7 @@ interface ScanState {
 
 export const useScanStore = create<ScanState>((set) => ({
   currentImage: null,
+  currentImageBase64: null,
   detectedFurniture: [],
   selectedFurniture: null,
   productMatches: [],
@@ -40,7 +42,7 @@ export const useScanStore = create<ScanState>((set) => ({
   isLoading: false,
   error: null,
 
-  setCurrentImage: (uri) => set({ currentImage: uri }),
+  setCurrentImage: (uri, base64 = null) => set({ currentImage: uri, currentImageBase64: base64 }),
   setDetectedFurniture: (furniture) => set({ detectedFurniture: furniture }),
   setSelectedFurniture: (furniture) => set({ selectedFurniture: furniture }),
   setProductMatches: (products) => set({ productMatches: products }),
@@ -57,6 +59,7 @@ export const useScanStore = create<ScanState>((set) => ({
   clearScan: () =>
     set({
       currentImage: null,
+      currentImageBase64: null,
       detectedFurniture: [],
       selectedFurniture: null,
       productMatches: [],